@@ -0,0 +1,133 @@
+import sys
+import json
+import logging
+import argparse
+import multiprocessing
+from functools import lru_cache
+from itertools import islice
+from time import perf_counter
+from topology import TOPOLOGIES, get_board
+
+SOLVERS = ("gf2", "astar", "mcts")
+
+@lru_cache(maxsize=64)
+def get_geometry(rows, cols, topology="grid"):
+    # Grounded once per worker and board shape, then shared by every board of that shape
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology {topology} (expected one of {', '.join(TOPOLOGIES)})")
+    board = get_board(TOPOLOGIES[topology](rows, cols))
+    return board, {cell: i for i, cell in enumerate(board.cells)}
+
+def solve_description(description, solver="gf2", heuristic="chase", max_expansions=None, iterations=1000, seed=0, log_every=None):
+    """
+    Solve one board given as {"rows": r, "cols": c, "on": [cells]}, the lines generator.py prints.
+    Cells may be given by name or by index, cols defaults to rows, "topology" to "grid", and an
+    optional "id" is echoed.
+
+    Returns:
+        dict: The id, whether it was solved, its plan and cost, and the search time and expansions.
+    """
+    rows = description["rows"]
+    cols = description.get("cols", rows)
+    board, index = get_geometry(rows, cols, description.get("topology", "grid"))
+    init = 0
+    for cell in description.get("on", []):
+        init |= 1 << (cell if isinstance(cell, int) else index[cell])
+    board = board._replace(init=init)
+    start = perf_counter()
+    expansions = 0
+    if solver == "gf2":
+        from bitboard import get_set_bits
+        from board_solver_gf2 import get_press_set
+        presses = get_press_set(board)
+        actions = None if presses is None else get_set_bits(presses)
+    elif solver == "astar":
+        from board_solver import astar_search
+        from instrumentation import SearchStats
+        stats = SearchStats()
+        plan = astar_search(board, heuristic, stats, max_expansions=max_expansions, log_every=log_every)
+        actions = [index[action.split(" ")[1]] for _, action in plan[:-1]] if plan else None
+        expansions = stats.counters["expansions"]
+    else:
+        from board_solver_mcts import MCTS
+        search = MCTS(board, seed=seed)
+        search.run(iterations=iterations)
+        actions = search.best_presses
+        expansions = search.iterations
+    elapsed = perf_counter() - start
+    return {
+        "id": description.get("id"),
+        "solved": actions is not None,
+        "cost": None if actions is None else len(actions),
+        "plan": None if actions is None else [board.cells[action] for action in actions],
+        "time": elapsed,
+        "expansions": expansions,
+    }
+
+worker_options = {}
+
+def init_worker(options):
+    global worker_options
+    worker_options = options
+
+def solve_line(numbered_line):
+    number, line = numbered_line
+    try:
+        return json.dumps(solve_description(json.loads(line), **worker_options))
+    except (ValueError, KeyError, TypeError, IndexError) as error:
+        return json.dumps({"line": number, "error": f"{type(error).__name__}: {error}"})
+
+def solve_stream(lines, output, workers=1, window=1024, **options):
+    """
+    Solve every non-empty JSON line of an input stream and write one JSON result line per board,
+    in input order. At most window boards are read ahead, so memory stays bounded whatever the
+    length of the input.
+    """
+    numbered = ((number, line) for number, line in enumerate(lines, 1) if line.strip())
+    if workers <= 1:
+        init_worker(options)
+        for numbered_line in numbered:
+            output.write(solve_line(numbered_line) + "\n")
+        return
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(options,)) as pool:
+        while True:
+            chunk = list(islice(numbered, window))
+            if not chunk:
+                break
+            for result in pool.imap(solve_line, chunk, chunksize=max(1, len(chunk) // (workers * 4))):
+                output.write(result + "\n")
+            output.flush()
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Solve a stream of boards given as JSON lines.")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL file of boards, - for stdin")
+    parser.add_argument("--output", default="-", help="JSONL file of results, - for stdout")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--window", type=int, default=1024, help="boards read ahead of the output")
+    parser.add_argument("--solver", choices=SOLVERS, default="gf2")
+    parser.add_argument("--heuristic", default="chase", help="A* heuristic")
+    parser.add_argument("--max-expansions", type=int, default=None, help="A* expansion cap")
+    parser.add_argument("--iterations", type=int, default=1000, help="MCTS iterations")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--log-every", type=int, default=None, help="log A* progress every N expansions on stderr")
+    return parser
+
+def main(argv=None):
+    options = get_parser().parse_args(argv)
+    if options.log_every:
+        logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(processName)s %(message)s")
+    source = sys.stdin if options.input == "-" else open(options.input)
+    output = sys.stdout if options.output == "-" else open(options.output, "w")
+    try:
+        solve_stream(source, output, options.workers, options.window, solver=options.solver,
+                     heuristic=options.heuristic, max_expansions=options.max_expansions,
+                     iterations=options.iterations, seed=options.seed, log_every=options.log_every)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
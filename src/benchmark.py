@@ -0,0 +1,224 @@
+import sys
+import json
+import argparse
+import tracemalloc
+from time import perf_counter
+from bitboard import is_goal
+from generator import generate_boards
+from board_solver import astar_search, lookup_plan, get_plan
+from board_solver_gf2 import get_press_set
+from board_solver_mcts import MCTS
+from board_solver_bounded import ida_star_search, bounded_astar_search
+from board_solver_bidirectional import bidirectional_search
+from board_solver_anytime import anytime_search
+from board_solver_parallel import root_parallel_mcts, leaf_parallel_mcts
+from instrumentation import SearchStats
+
+#--------------------------------------------------------------------------------------------------------#
+#------------------------------------------ SOLVERS -----------------------------------------------------#
+#--------------------------------------------------------------------------------------------------------#
+
+# Every solver takes a compiled board and the run options, and returns its plan and the number of
+# nodes it expanded (A* expansions, MCTS iterations)
+
+def get_heuristic_name(options, optimal=False):
+    # IDA* and bounded A* promise optimal plans, which takes an admissible heuristic
+    if options.heuristic is not None:
+        return options.heuristic
+    return "toggle" if optimal else "chase"
+
+def run_astar(board, options):
+    stats = SearchStats()
+    plan = astar_search(board, get_heuristic_name(options), stats, max_expansions=options.max_expansions)
+    return plan, stats.counters["expansions"]
+
+def run_gf2(board, options):
+    presses = get_press_set(board)
+    if presses is None:
+        return [], 0
+    return get_plan(board, board.init, [i for i in range(len(board.cells)) if presses >> i & 1]), 0
+
+def run_mcts(board, options):
+    search = MCTS(board, seed=options.seed)
+    plan = search.run(iterations=options.iterations)
+    return plan, search.iterations
+
+def run_ida(board, options):
+    stats = SearchStats()
+    plan = ida_star_search(board, get_heuristic_name(options, optimal=True), options.memory * 2**20, stats=stats, max_expansions=options.max_expansions)
+    return plan, stats.counters["expansions"]
+
+def run_bounded(board, options):
+    stats = SearchStats()
+    plan = bounded_astar_search(board, get_heuristic_name(options, optimal=True), options.memory * 2**20, stats, options.max_expansions)
+    return plan, stats.counters["expansions"]
+
+def run_bidirectional(board, options):
+    stats = SearchStats()
+    plan = bidirectional_search(board, stats, options.max_expansions)
+    return plan, stats.counters["expansions"]
+
+def run_anytime(board, options):
+    stats = SearchStats()
+    deadline = None if options.time_limit is None else perf_counter() + options.time_limit
+    plan = anytime_search(board, get_heuristic_name(options), deadline=deadline, max_expansions=options.max_expansions, stats=stats)
+    return plan, stats.counters["expansions"]
+
+def run_parallel(board, options):
+    # Root mode runs the iterations on every worker, leaf mode in total
+    if options.parallel_mode == "leaf":
+        return leaf_parallel_mcts(board, options.workers, options.iterations, seed=options.seed), options.iterations
+    plan, _ = root_parallel_mcts(board, options.workers, options.iterations, seed=options.seed)
+    return plan, options.iterations * options.workers
+
+def run_lookup(board, options):
+    # Nodes are the states expanded to build the table, none once it is cached
+    from distance_table import MAX_CELLS
+    if len(board.cells) > MAX_CELLS:
+        return [], 0
+    stats = SearchStats()
+    plan = lookup_plan(board, stats)
+    return plan, stats.counters["expansions"]
+
+SOLVERS = {
+    "astar": run_astar,
+    "gf2": run_gf2,
+    "mcts": run_mcts,
+    "ida": run_ida,
+    "bounded": run_bounded,
+    "bidirectional": run_bidirectional,
+    "anytime": run_anytime,
+    "parallel": run_parallel,
+    "lookup": run_lookup,
+}
+
+#--------------------------------------------------------------------------------------------------------#
+#------------------------------------------ BENCHMARK ---------------------------------------------------#
+#--------------------------------------------------------------------------------------------------------#
+
+def get_boards(sizes, seeds, seed=0):
+    # Scrambled from the goal, so every board is solvable
+    for size in sizes:
+        boards = generate_boards(size, size, f"{seed}:{size}", count=seeds, solvable=True)
+        for board_seed, board in enumerate(boards):
+            yield size, board_seed, board
+
+def run_benchmark(sizes, seeds, solvers, options, measure_memory=True):
+    """
+    Run every solver on every board and measure it.
+
+    Returns:
+        list: One dict per run with the solver, board size and seed, success, wall time, nodes
+        expanded, peak traced memory in bytes (None if not measured) and plan length.
+    """
+    results = []
+    for size, board_seed, board in get_boards(sizes, seeds, options.seed):
+        for name in solvers:
+            solver = SOLVERS[name]
+            start = perf_counter()
+            plan, expansions = solver(board, options)
+            elapsed = perf_counter() - start
+            peak_memory = None
+            if measure_memory:
+                # Separate run, tracing allocations slows the solver down too much to time it
+                tracemalloc.start()
+                solver(board, options)
+                peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            results.append({
+                "solver": name,
+                "size": size,
+                "seed": board_seed,
+                "success": is_solution(board, plan),
+                "time": elapsed,
+                "expansions": expansions,
+                "peak_memory": peak_memory,
+                "plan_length": len(plan) - 1 if plan else None,
+            })
+            print(format_result(results[-1]), file=sys.stderr)
+    return results
+
+def is_solution(board, plan):
+    if not plan:
+        return False
+    index = {cell: i for i, cell in enumerate(board.cells)}
+    state = 0
+    for cell in plan[-1][0]:
+        state |= 1 << index[cell]
+    return is_goal(board, state)
+
+def format_result(result):
+    memory = "-" if result["peak_memory"] is None else f"{result['peak_memory'] / 1024:.0f}KiB"
+    return (f"{result['solver']:>13} {result['size']:>3}x{result['size']:<3} seed {result['seed']:<3} "
+            f"{'ok' if result['success'] else 'FAIL':>4} {result['time'] * 1000:10.2f}ms "
+            f"{result['expansions']:>8} nodes {memory:>10} plan {result['plan_length']}")
+
+def compare(results, baseline, tolerance=0.25, min_time=0.005):
+    """
+    Compare results against a saved baseline run, matching runs by solver, size and seed.
+
+    Args:
+        results (list): Current results, see run_benchmark.
+        baseline (list): Baseline results.
+        tolerance (float): Relative slack allowed on time and memory.
+        min_time (float): Times under this many seconds are too noisy to be flagged.
+
+    Returns:
+        list: A description of every regression found.
+    """
+    previous = {(r["solver"], r["size"], r["seed"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        key = (result["solver"], result["size"], result["seed"])
+        if key not in previous:
+            continue
+        before = previous[key]
+        name = f"{result['solver']} {result['size']}x{result['size']} seed {result['seed']}"
+        if before["success"] and not result["success"]:
+            regressions.append(f"{name}: no longer solved")
+            continue
+        if result["time"] > max(before["time"] * (1 + tolerance), min_time):
+            regressions.append(f"{name}: {before['time'] * 1000:.2f}ms -> {result['time'] * 1000:.2f}ms")
+        if before["success"] and result["plan_length"] > before["plan_length"]:
+            regressions.append(f"{name}: plan length {before['plan_length']} -> {result['plan_length']}")
+        if result["peak_memory"] is not None and before["peak_memory"] is not None \
+                and result["peak_memory"] > before["peak_memory"] * (1 + tolerance):
+            regressions.append(f"{name}: peak memory {before['peak_memory']} -> {result['peak_memory']} bytes")
+    return regressions
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the Lights Out solvers across board sizes and seeds.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3, 4, 5, 6, 8, 10, 15, 20])
+    parser.add_argument("--seeds", type=int, default=3, help="boards per size")
+    parser.add_argument("--solvers", nargs="+", choices=sorted(SOLVERS), default=sorted(SOLVERS))
+    parser.add_argument("--heuristic", default=None, help="A* heuristic, chase by default and toggle for IDA* and bounded A*")
+    parser.add_argument("--max-expansions", type=int, default=2000, help="expansion cap of the A* family and the bidirectional search")
+    parser.add_argument("--iterations", type=int, default=200, help="MCTS iterations, per worker in root-parallel MCTS")
+    parser.add_argument("--workers", type=int, default=2, help="parallel MCTS worker processes")
+    parser.add_argument("--parallel-mode", choices=("root", "leaf"), default="root", help="parallel MCTS mode")
+    parser.add_argument("--time-limit", type=float, default=None, help="anytime search budget in seconds")
+    parser.add_argument("--memory", type=int, default=256, help="memory budget of IDA* and bounded A* in MiB")
+    parser.add_argument("--seed", type=int, default=0, help="master seed of the boards and solvers")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory runs")
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the results")
+    parser.add_argument("--baseline", help="results of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    return parser
+
+def main(argv=None):
+    options = get_parser().parse_args(argv)
+    results = run_benchmark(options.sizes, options.seeds, options.solvers, options, not options.no_memory)
+    with open(options.output, "w") as file:
+        json.dump({"options": vars(options), "results": results}, file, indent=1)
+    if options.baseline:
+        with open(options.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, options.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
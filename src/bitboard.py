@@ -0,0 +1,196 @@
+import pickle
+import hashlib
+from collections import namedtuple
+from cache import get_cache_path, write_atomic
+from instrumentation import phase
+
+# A compiled board: cells are numbered by their position in `cells`, a state is an int whose
+# bit i is set when cell i is on, and masks[i] is the XOR toggle mask of "press_cell cells[i]".
+Board = namedtuple("Board", ["cells", "masks", "init", "goal", "action"])
+
+def load_board(domain_file, problem_file, use_cache=True, stats=None):
+    """
+    Parse and compile a PDDL domain and problem file, reusing the on-disk cache when both files
+    have been compiled before.
+
+    Args:
+        domain_file (str): Path to the PDDL domain file.
+        problem_file (str): Path to the PDDL problem file.
+        use_cache (bool): Whether to load and save the compiled board from the on-disk cache.
+        stats (SearchStats): If given, times the cache lookup, parsing and grounding phases.
+
+    Returns:
+        Board: The compiled board.
+    """
+    path = None
+    if use_cache:
+        digest = hashlib.sha256()
+        for file_path in (domain_file, problem_file):
+            with open(file_path, "rb") as file:
+                digest.update(file.read())
+            digest.update(b"\0")
+        path = get_cache_path("boards", digest.hexdigest()[:32], "pickle")
+        try:
+            with phase(stats, "cache"), open(path, "rb") as file:
+                return Board(*pickle.load(file))
+        except (OSError, pickle.UnpicklingError, EOFError, TypeError):
+            pass
+    # The parser is only imported when there is something to parse, a cache hit skips it
+    with phase(stats, "parse"):
+        from parsers import parse_domain, parse_problem
+        domain = parse_domain(domain_file)
+        problem = parse_problem(problem_file)
+    with phase(stats, "ground"):
+        board = compile_board(domain, problem)
+    if path is not None:
+        write_atomic(path, [pickle.dumps(tuple(board), pickle.HIGHEST_PROTOCOL)])
+    return board
+
+def compile_board(domain, problem):
+    """
+    Ground the press action of a parsed domain over the cells of a parsed problem.
+
+    Args:
+        domain (Domain): Parsed PDDL domain.
+        problem (Problem): Parsed PDDL problem.
+
+    Returns:
+        Board: The compiled board, with one toggle mask per cell.
+    """
+    from topology import problem_topology
+    cells = tuple(sorted(get_cells(domain), key=cell_key))
+    index = {cell: i for i, cell in enumerate(cells)}
+    if len(domain.actions) != 1:
+        raise ValueError(f"Expected a single press action, found {len(domain.actions)}")
+    action = domain.actions[0]
+    toggles = get_neighbour_toggles(action, index)
+    if toggles is not None:
+        # The usual press, the cell itself and its adjacent cells: linear in the adjacency facts
+        topology = problem_topology(problem, index)
+        masks = tuple(get_neighbour_mask(topology, i, *toggles) for i in range(len(cells)))
+    else:
+        adjacencies = get_adjacencies(problem)
+        masks = tuple(get_toggle_mask(action, cell, index, adjacencies) for cell in cells)
+    init = get_cells_on(problem.init, index)
+    goal = get_cells_on(problem.goal, index)
+    return Board(cells, masks, init, goal, action.name)
+
+def get_toggle_mask(action, cell, index, adjacencies):
+    from parsers import UnaryPredicate, BinaryPredicate
+    parameter = action.parameters[0].name
+    turns_on = set()
+    turns_off = set()
+    for effect in action.effects:
+        static = True
+        dynamic = []
+        for condition in effect.conditions:
+            if isinstance(condition, BinaryPredicate):
+                parameter1 = cell if condition.parameter1 == parameter else condition.parameter1
+                parameter2 = cell if condition.parameter2 == parameter else condition.parameter2
+                if ({parameter1, parameter2} in adjacencies) != condition.positive:
+                    static = False
+            elif isinstance(condition, UnaryPredicate):
+                target = cell if condition.parameter == parameter else condition.parameter
+                dynamic.append(UnaryPredicate(condition.name, target, condition.positive))
+        if not static:
+            continue
+        for eff in effect.effects:
+            target = cell if eff.parameter == parameter else eff.parameter
+            # Only "when (not (cell_on x)) (cell_on x)" and its opposite can be compiled to a XOR
+            if dynamic != [UnaryPredicate(eff.name, target, not eff.positive)]:
+                raise ValueError(f"Effect {effect} of {action.name} is not a toggle")
+            if eff.positive:
+                turns_on.add(target)
+            else:
+                turns_off.add(target)
+    if turns_on != turns_off:
+        raise ValueError(f"{action.name} {cell} does not toggle {turns_on ^ turns_off} both ways")
+    mask = 0
+    for target in turns_on:
+        mask |= 1 << index[target]
+    return mask
+
+def get_neighbour_toggles(action, index):
+    # Recognise the effects "when (cell_on ?c) toggle ?c" and "when (cell_adjacent ?c x) toggle x",
+    # returning whether the cell toggles itself and the mask of the cells x, or None for any other
+    from parsers import UnaryPredicate, BinaryPredicate
+    parameter = action.parameters[0].name
+    turns_on = set()
+    turns_off = set()
+    for effect in action.effects:
+        binaries = [condition for condition in effect.conditions if isinstance(condition, BinaryPredicate)]
+        unaries = [condition for condition in effect.conditions if isinstance(condition, UnaryPredicate)]
+        if len(effect.effects) != 1 or len(binaries) + len(unaries) != len(effect.conditions):
+            return None
+        eff = effect.effects[0]
+        if binaries:
+            if len(binaries) != 1 or not binaries[0].positive:
+                return None
+            ends = {binaries[0].parameter1, binaries[0].parameter2}
+            if parameter not in ends or len(ends) != 2 or ends - {parameter} != {eff.parameter}:
+                return None
+        elif eff.parameter != parameter:
+            return None
+        if unaries != [UnaryPredicate(eff.name, eff.parameter, not eff.positive)]:
+            return None
+        (turns_on if eff.positive else turns_off).add(eff.parameter)
+    if turns_on != turns_off:
+        return None
+    targets = 0
+    for target in turns_on - {parameter}:
+        if target not in index:
+            return None
+        targets |= 1 << index[target]
+    return parameter in turns_on, targets
+
+def get_neighbour_mask(topology, cell, toggles_self, targets):
+    mask = 1 << cell if toggles_self else 0
+    for other in topology.neighbours(cell):
+        if targets >> other & 1:
+            mask |= 1 << other
+    return mask
+
+def get_adjacencies(problem):
+    from parsers import BinaryPredicate
+    res = set()
+    for predicate in problem.init:
+        if isinstance(predicate, BinaryPredicate):
+            res.add(frozenset([predicate.parameter1, predicate.parameter2]))
+    return res
+
+def get_cells_on(predicates, index):
+    from parsers import UnaryPredicate
+    res = 0
+    for fact in predicates:
+        if isinstance(fact, UnaryPredicate) and fact.name == "cell_on":
+            res |= 1 << index[fact.parameter]
+    return res
+
+def get_cells(domain):
+    res = set()
+    for constant in domain.constants:
+        if constant.type == "cell":
+            res.add(constant.name)
+    return res
+
+def cell_key(cell):
+    # Natural order, so that c2_10 comes after c2_9 and cell indexes follow the board rows
+    import re
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", cell)]
+
+def is_goal(board, state):
+    return state & board.goal == board.goal
+
+def get_state_cells(board, state):
+    return frozenset(cell for i, cell in enumerate(board.cells) if state >> i & 1)
+
+def get_action_name(board, action):
+    return f"{board.action} {board.cells[action]}"
+
+def get_set_bits(mask):
+    res = []
+    while mask:
+        low = mask & -mask
+        res.append(low.bit_length() - 1)
+        mask ^= low
+    return res
@@ -1,203 +1,279 @@
-from parsers import parse_domain, parse_problem, Constant, UnaryPredicate, BinaryPredicate, Action, Domain, Effect
+from bitboard import load_board, is_goal, get_state_cells, get_action_name
 from math import inf as infinity
-from collections import defaultdict
-from Node import Node
+from heapq import heappush, heappop
+from heuristics import get_heuristic
+from instrumentation import phase
+from state_store import StateStore, EMPTY
+import logging
 
-def solve_board(domain_file, problem_file):
+logger = logging.getLogger(__name__)
+
+# Fields of the packed open list keys of compact_astar_search
+G_MAX = 0xFFFF
+
+# Successor policies of astar_search and MCTS: every press from every state, or only the presses
+# after the last one, which searches press sets instead of press sequences
+SUCCESSORS = ("all", "ordered")
+INDEX_MASK = 0xFFFFFFFF
+
+def solve_board(domain_file, problem_file, heuristic="count", stats=None, log_every=None, compact=False, symmetry=False, successors="all", lookup=False):
     """
-    Solve a PDDL domain and problem file using the unified-planning library.
+    Solve a PDDL domain and problem file with A* search.
     
     Args:
         domain_file (str): Path to the PDDL domain file.
         problem_file (str): Path to the PDDL problem file.
+        heuristic (str): Name of the heuristic in heuristics.HEURISTICS guiding the search.
+        stats (SearchStats): If given, filled with the search counters and the parse, ground,
+            search and reconstruction times.
+        log_every (int): If given, log the search progress every log_every expansions.
+        compact (bool): Store the search states compactly, see compact_astar_search.
+        symmetry (bool): Search states up to the symmetries of the board, see symmetry.py.
+        successors (str): Successor policy, "all" presses or only the "ordered" ones after the last.
+        lookup (bool): Read an optimal plan from the distance table of the board instead of
+            searching, building the table the first time, see distance_table.py.
 
     Returns:
-        str: The solution plan as a string.
+        list: The solution plan as (state, action) pairs, or [] if there is none.
     """
 
-    # Parse the domain and problem files
-    domain = parse_domain(domain_file)
-    problem = parse_problem(problem_file)
-    cells = get_cells(domain)
-    actions = []
-    for cell in cells:
-        actions.append(f"press_cell {cell}")
-    adjacencies = set()
-    for predicate in problem.init:
-        if isinstance(predicate, BinaryPredicate):
-            adjacencies.add(frozenset([predicate.parameter1, predicate.parameter2]))
-    goal_cells = get_cells_on(problem.goal)
-    # Initialize the A* search algorithm
-    initial_cells_on = frozenset(get_cells_on(problem.init))
-    nodes = set()
+    # Parse and compile the domain and problem files, or load them from the cache
+    board = load_board(domain_file, problem_file, stats=stats)
+    if lookup:
+        return lookup_plan(board, stats)
+    if compact:
+        return compact_astar_search(board, heuristic, stats, log_every=log_every)
+    return astar_search(board, heuristic, stats, log_every=log_every, symmetry=symmetry, successors=successors)
+
+def lookup_plan(board, stats=None):
+    from distance_table import load_distance_table
+    with phase(stats, "table"):
+        table = load_distance_table(board, stats=stats)
+    with phase(stats, "reconstruction"):
+        actions = table.get_actions(board.init)
+        return [] if actions is None else get_plan(board, board.init, actions)
+
+def astar_search(board, heuristic="count", stats=None, max_expansions=None, log_every=None, symmetry=False, successors="all"):
+    from board_solver_gf2 import is_solvable
+    if successors not in SUCCESSORS:
+        raise ValueError(f"Unknown successor policy {successors} (expected one of {', '.join(SUCCESSORS)})")
+    ordered = successors == "ordered"
+    if ordered and symmetry:
+        raise ValueError("Symmetry reduction permutes the cells, it cannot be combined with ordered successors")
+    with phase(stats, "heuristic"):
+        h = get_heuristic(heuristic, board)
+    canonical = None
+    if symmetry:
+        # States are searched up to the board symmetries, see symmetry.py
+        from symmetry import get_symmetries, make_canonical, get_symmetric_solution_path
+        with phase(stats, "symmetry"):
+            symmetries = get_symmetries(board)
+            canonical = make_canonical(board, symmetries)
+        transforms = {}
+    sample_every = None if stats is None else stats.sample_every
+    expansions = generated = reopened = dead_ends = heap_peak = candidates = 0
+    n = len(board.cells)
+    actions = range(n)
+    masks = board.masks
+    initial_cells_on = board.init
+    if ordered:
+        # Presses commute and cancel in pairs, so every plan can be played as a set of distinct
+        # presses in increasing order. Search nodes are then a state and the next press allowed,
+        # packed into one int as state << shift | first press.
+        shift = n.bit_length()
+        first_mask = (1 << shift) - 1
+        state_h = h
+        h = lambda key: state_h(key >> shift)
+        # reach[k] is every cell that the presses from k on can still toggle
+        reach = [0] * (n + 1)
+        for action in reversed(actions):
+            reach[action] = reach[action + 1] | masks[action]
+        goal_cells = board.goal
+        initial_cells_on <<= shift
+    if canonical is not None:
+        initial_cells_on, initial_transform = canonical(initial_cells_on)
     # 1
-    g = defaultdict(lambda: infinity)
-    g[initial_cells_on] = 0
-    # 2
-    f = defaultdict(lambda: infinity)
-    h = get_h_add(cells, initial_cells_on)
-    f[initial_cells_on] = h
-    # 3
+    g = {initial_cells_on: 0}
+    parents = {initial_cells_on: (None, None)}
+    # 2-4: heap entries are (f, -g, state), so ties on f prefer the deepest state. An unsolvable
+    # board would only end once every reachable state was expanded, it is rejected up front.
+    open_heap = [(h(initial_cells_on), 0, initial_cells_on)] if is_solvable(board) else []
     closed = set()
-    # 4
-    open_states = {initial_cells_on}
-    nodes.add(Node(initial_cells_on, None, None))
+    goal = None
     # 5
-    while open_states:
-        # 6
-        s = min(open_states, key=lambda x: f[x])
-        print(get_h_add(cells, s))
-        open_states.remove(s)
-        # 7
-        closed.add(s)
-        # 8
-        if goal_cells in s:
-            # 9
-            return get_solution_path(s, None, nodes)
-        # 10
-        for action in actions:
-            # 11
-            next_s = frozenset(apply_action(domain.actions,s, action, adjacencies))
-            node = Node(next_s, s, action)
-            # 12
-            if next_s in open_states and g[s] + 1 < g[next_s]:
-                # print("1st condition met")
-                # 13
-                if node in nodes:
-                    nodes.remove(node)
-                nodes.add(node)
-                # 14
-                g[next_s] = g[s] + 1
-                # 15
-                f[next_s] = g[next_s] + get_h_add(cells, next_s)
-            # 16
-            elif next_s in closed and g[s] + 1 < g[next_s]:
-                # print("2nd condition met")
-                # 17
-                if node in nodes:
-                    nodes.remove(node)
-                nodes.add(node)
-                # 18
-                g[next_s] = g[s] + 1
-                # 19
-                f[next_s] = g[next_s] + get_h_add(cells, next_s)
-                # 20
-                closed.remove(next_s)
-                # 21
-                open_states.add(next_s)
-            # 22
-            elif next_s not in open_states and next_s not in closed:
-                # print("3rd condition met")
-                # 23
-                if node in nodes:
-                    nodes.remove(node)
-                nodes.add(node)
-                # 24
-                g[next_s] = g[s] + 1
-                # 25
-                f[next_s] = g[next_s] + get_h_add(cells, next_s)
-                # 26
-                open_states.add(next_s)
-            # else:
-            #     print("No condition met")
+    with phase(stats, "search"):
+        while open_heap:
+            # 6
+            f, neg_g, s = heappop(open_heap)
+            if -neg_g != g[s]:
+                # Stale entry, a cheaper path to s was pushed after this one
+                continue
+            state = s >> shift if ordered else s
+            # 8
+            if is_goal(board, state):
+                goal = s
+                break
+            if expansions == max_expansions:
+                break
+            # 7
+            closed.add(s)
+            expansions += 1
+            if log_every and expansions % log_every == 0:
+                logger.info("expansion %d: g=%d h=%d open=%d", expansions, -neg_g, f + neg_g, len(open_heap))
+            if sample_every and expansions % sample_every == 0:
+                stats.sample({"expansions": expansions, "g": -neg_g, "h": f + neg_g, "open": len(open_heap), "closed": len(closed)})
+            # 10
+            next_g = g[s] + 1
+            successor_actions = range(s & first_mask, n) if ordered else actions
+            candidates += len(successor_actions)
+            for action in successor_actions:
+                # 11
+                next_s = state ^ masks[action]
+                if canonical is not None:
+                    next_s, transform = canonical(next_s)
+                if ordered:
+                    if goal_cells & ~next_s & ~reach[action + 1]:
+                        # A goal cell is off and no press left can switch it on
+                        dead_ends += 1
+                        continue
+                    next_s = next_s << shift | action + 1
+                # 12-26: new, open and closed states are all (re)opened when reached more cheaply
+                if next_g < g.get(next_s, infinity):
+                    next_h = h(next_s)
+                    if next_h == infinity:
+                        # Dead end, the goal cannot be reached from next_s
+                        dead_ends += 1
+                        continue
+                    if next_s in closed:
+                        closed.remove(next_s)
+                        reopened += 1
+                    g[next_s] = next_g
+                    parents[next_s] = (s, action)
+                    if canonical is not None:
+                        transforms[next_s] = transform
+                    heappush(open_heap, (next_g + next_h, -next_g, next_s))
+                    generated += 1
+            if len(open_heap) > heap_peak:
+                heap_peak = len(open_heap)
+    # 9
+    plan = []
+    if goal is not None:
+        with phase(stats, "reconstruction"):
+            if ordered:
+                plan = get_plan(board, board.init, get_path_actions(goal, parents))
+            elif canonical is None:
+                plan = get_solution_path(board, goal, parents)
+            else:
+                plan = get_symmetric_solution_path(board, goal, parents, transforms, symmetries, initial_transform)
     # 27
-    return []
+    if stats is not None:
+        stats.add("expansions", expansions)
+        stats.add("generated", generated)
+        stats.add("reopened", reopened)
+        # Every other successor was already reached at least as cheaply
+        stats.add("duplicates", candidates - generated - dead_ends)
+        stats.maximum("heap_size", heap_peak)
+    return plan
     
-def get_h_add(cells, state):
-    res = 0
-    for cell in cells:
-        if cell not in state:
-            res += 1
-    return res
-
-def get_cells_on(predicates):
-    res = set()
-    for fact in predicates:
-        if isinstance(fact, UnaryPredicate) and fact.name == "cell_on":
-            res.add(fact.parameter)
-    return res
-
-def get_cells(domain):
-    res = set()
-    for constant in domain.constants:
-        if constant.type == "cell":
-            res.add(constant.name)
-    return res
-
-def apply_action(actions, state, action, adjacencies):
-    obj = action.split(" ")
-    action_name = obj[0]
-    cell = obj[1]
-    action_effects = get_action_effects(actions, state, action_name, cell, adjacencies)
-    new_state = set(state)
-    for effect in action_effects:
-        for eff in effect.effects:
-            if eff.positive:
-                new_state.add(eff.parameter)
-            else:
-                new_state.remove(eff.parameter)
-    return new_state
-
-def get_action_effects(actions, state, action_name, cell, adjacencies):
-    res = []
-    for action in actions:
-        if action.name == action_name:
-            for effect in action.effects:
-                parsed_conditions = []
-                skip = True
-                conditions = effect.conditions
-                if len(conditions) == 1:
-                    condition = conditions[0]
-                    if isinstance(condition, UnaryPredicate):
-                        if condition.parameter == "c":
-                            condition = UnaryPredicate(condition.name, cell, condition.positive)
-                            if condition.parameter in state and condition.positive or condition.parameter not in state and not condition.positive:
-                                parsed_conditions.append(condition)
-                else:
-                    for condition in conditions:
-                        if isinstance(condition, UnaryPredicate):
-                            if condition.parameter == "c":
-                                parsed_conditions.append(UnaryPredicate(condition.name, cell, condition.positive))
-                            if (condition.parameter in state and condition.positive or condition.parameter not in state and not condition.positive) and {cell, condition.parameter} in adjacencies:
-                                parsed_conditions.append(condition)
-                            else:
-                                continue
-                        elif isinstance(condition, BinaryPredicate):
-                            if condition.parameter1 == "c" and {cell, condition.parameter2} in adjacencies:
-                                parsed_conditions.append(BinaryPredicate(condition.name, cell, condition.parameter2, condition.positive))
-                            elif condition.parameter2 == "c" and {cell, condition.parameter1} in adjacencies:
-                                parsed_conditions.append(BinaryPredicate(condition.name, condition.parameter1, cell, condition.positive))
-                for parsed_condition in parsed_conditions:
-                    if isinstance(parsed_condition, UnaryPredicate):
-                        skip = False
-                if skip:
+def compact_astar_search(board, heuristic="count", stats=None, max_expansions=None, log_every=None):
+    """
+    The same search as astar_search, storing its states in a StateStore instead of dicts keyed by
+    state, and its open list as plain ints packing (f, g, index). Slower per expansion, but a
+    stored state costs tens of bytes instead of hundreds, so much larger searches fit in memory.
+    """
+    from board_solver_gf2 import is_solvable
+    with phase(stats, "heuristic"):
+        h = get_heuristic(heuristic, board)
+    sample_every = None if stats is None else stats.sample_every
+    expansions = generated = reopened = dead_ends = heap_peak = 0
+    actions = range(len(board.cells))
+    masks = board.masks
+    store = StateStore(len(board.cells))
+    store_g = store.g
+    store.add(board.init, EMPTY, 0, 0)
+    # One flag per stored state
+    closed = bytearray(1)
+    # Heap keys order by f, then by largest g, then by index; an infinite h never gets a key
+    init_h = h(board.init)
+    open_heap = [init_h << 48 | G_MAX << 32] if init_h != infinity and is_solvable(board) else []
+    goal = None
+    with phase(stats, "search"):
+        while open_heap:
+            key = heappop(open_heap)
+            index = key & INDEX_MASK
+            g = G_MAX - (key >> 32 & G_MAX)
+            if g != store_g[index]:
+                continue
+            s = store.get_state(index)
+            if is_goal(board, s):
+                goal = index
+                break
+            if expansions == max_expansions:
+                break
+            closed[index] = 1
+            expansions += 1
+            if log_every and expansions % log_every == 0:
+                logger.info("expansion %d: g=%d h=%d open=%d", expansions, g, (key >> 48) - g, len(open_heap))
+            if sample_every and expansions % sample_every == 0:
+                stats.sample({"expansions": expansions, "g": g, "h": (key >> 48) - g, "open": len(open_heap), "stored": len(store)})
+            next_g = g + 1
+            for action in actions:
+                next_s = s ^ masks[action]
+                next_index = store.find(next_s)
+                if next_index != EMPTY and next_g >= store_g[next_index]:
+                    continue
+                next_h = h(next_s)
+                if next_h == infinity:
+                    dead_ends += 1
                     continue
-                parsed_effects = []
-                effects = effect.effects
-                for eff in effects:
-                    if eff.parameter == "c":
-                        parsed_effects.append(UnaryPredicate(eff.name, cell, eff.positive))
-                    else:
-                        parsed_effects.append(eff)
-                res.append(Effect(parsed_conditions, parsed_effects))
-    return res
+                if next_index == EMPTY:
+                    next_index = store.add(next_s, index, action, next_g)
+                    closed.append(0)
+                else:
+                    if closed[next_index]:
+                        closed[next_index] = 0
+                        reopened += 1
+                    store.update(next_index, index, action, next_g)
+                heappush(open_heap, (next_g + next_h) << 48 | (G_MAX - next_g) << 32 | next_index)
+                generated += 1
+            if len(open_heap) > heap_peak:
+                heap_peak = len(open_heap)
+    plan = []
+    if goal is not None:
+        with phase(stats, "reconstruction"):
+            plan = get_plan(board, board.init, store.get_path(goal))
+    if stats is not None:
+        stats.add("expansions", expansions)
+        stats.add("generated", generated)
+        stats.add("reopened", reopened)
+        stats.add("duplicates", expansions * len(actions) - generated - dead_ends)
+        stats.maximum("heap_size", heap_peak)
+    return plan
 
-def get_solution_path(state, action, nodes):
+def get_solution_path(board, state, parents):
     path = []
-    node = get_equal(nodes, state)
-    if node is None:
-        raise ValueError("State not found in nodes")
-    father, father_action = node.father
-    if father is not None:
-        path = get_solution_path(father, father_action, nodes)
-    path.append((state, action))
+    action = None
+    while state is not None:
+        path.append((get_state_cells(board, state), None if action is None else get_action_name(board, action)))
+        state, action = parents[state]
+    path.reverse()
     return path
 
-def get_equal(in_set, in_element):
-   for element in in_set:
-       if element == in_element:
-           return element
-   return None
+def get_path_actions(state, parents):
+    actions = []
+    while parents[state][0] is not None:
+        state, action = parents[state]
+        actions.append(action)
+    actions.reverse()
+    return actions
+
+def get_plan(board, state, actions):
+    path = []
+    for action in actions:
+        path.append((get_state_cells(board, state), get_action_name(board, action)))
+        state ^= board.masks[action]
+    path.append((get_state_cells(board, state), None))
+    return path
 
 if __name__ == "__main__":
     # Example usage
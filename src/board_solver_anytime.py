@@ -0,0 +1,131 @@
+from bitboard import load_board, is_goal
+from board_solver import get_solution_path
+from heuristics import get_heuristic
+from instrumentation import phase
+from heapq import heappush, heappop, heapify
+from math import inf as infinity
+from time import perf_counter
+
+WEIGHTS = (5, 3, 2, 1.5, 1.25, 1)
+
+# Deadline and cancellation are only checked every so many expansions, clock reads are not free
+CHECK_EVERY = 16
+
+def solve_board_anytime(domain_file, problem_file, heuristic="count", time_limit=None, on_improvement=None, stats=None):
+    """
+    Solve a PDDL domain and problem file with anytime weighted A*, see anytime_search.
+
+    Args:
+        domain_file (str): Path to the PDDL domain file.
+        problem_file (str): Path to the PDDL problem file.
+        heuristic (str): Name of the heuristic, the last plan is optimal if it is admissible.
+        time_limit (float): Wall-clock budget in seconds for the search.
+        on_improvement (callable): Called with every better plan and the weight that found it.
+        stats (SearchStats): If given, filled with the search counters and phase times.
+
+    Returns:
+        list: The best plan found as (state, action) pairs, or [] if none was found in time.
+    """
+    board = load_board(domain_file, problem_file, stats=stats)
+    deadline = None if time_limit is None else perf_counter() + time_limit
+    return anytime_search(board, heuristic, deadline=deadline, on_improvement=on_improvement, stats=stats)
+
+def anytime_search(board, heuristic="count", weights=WEIGHTS, deadline=None, max_expansions=None, cancel=None, on_improvement=None, stats=None):
+    """
+    ARA*: A* on f = g + w * h with a decreasing sequence of weights. The first, greedy search
+    finds a plan quickly; every following one keeps the g values, parents and open list of the
+    previous one and only re-expands the states whose g improved since they were expanded, which
+    tightens the plan until the weight reaches 1 or the budget runs out.
+
+    Args:
+        board (Board): Compiled board.
+        heuristic (str): Name of the heuristic.
+        weights (tuple): Decreasing heuristic weights, with an admissible heuristic the plan found
+            with weight w costs at most w times the optimum.
+        deadline (float): perf_counter time at which to stop and return the best plan so far.
+        max_expansions (int): Expansion budget over all the weights.
+        cancel (Event): Stop as soon as cancel.is_set(), for callers on other threads.
+        on_improvement (callable): Called with every better plan and the weight that found it.
+        stats (SearchStats): If given, filled with the search counters and phase times.
+
+    Returns:
+        list: The best plan found as (state, action) pairs, or [] if none was found in time.
+    """
+    with phase(stats, "heuristic"):
+        h = get_heuristic(heuristic, board)
+    masks = board.masks
+    actions = range(len(masks))
+    init = board.init
+    g = {init: 0}
+    parents = {init: (None, None)}
+    closed = set()
+    # Closed states whose g improved during the current weight, reopened at the next one
+    inconsistent = set()
+    goal = init if is_goal(board, init) else None
+    cost = 0 if goal is not None else infinity
+    weight = weights[0]
+    open_heap = [(weight * h(init), 0, init)]
+    expansions = generated = reopened = 0
+    stopped = False
+    with phase(stats, "search"):
+        for weight in weights:
+            if stopped or deadline is not None and perf_counter() >= deadline or cancel is not None and cancel.is_set():
+                break
+            # Rekey the open list and the inconsistent states for the new weight
+            entries = {s for _, neg_g, s in open_heap if -neg_g == g[s] and s not in closed} | inconsistent
+            open_heap = [(g[s] + weight * h(s), -g[s], s) for s in entries]
+            heapify(open_heap)
+            closed.clear()
+            inconsistent.clear()
+            improved = False
+            while open_heap and open_heap[0][0] < cost:
+                f, neg_g, s = heappop(open_heap)
+                if -neg_g != g[s] or s in closed:
+                    continue
+                if expansions == max_expansions:
+                    stopped = True
+                    break
+                if expansions % CHECK_EVERY == 0 and (deadline is not None and perf_counter() >= deadline
+                                                      or cancel is not None and cancel.is_set()):
+                    stopped = True
+                    break
+                closed.add(s)
+                expansions += 1
+                next_g = g[s] + 1
+                for action in actions:
+                    next_s = s ^ masks[action]
+                    if next_g < g.get(next_s, infinity):
+                        next_h = h(next_s)
+                        if next_h == infinity:
+                            continue
+                        g[next_s] = next_g
+                        parents[next_s] = (s, action)
+                        if next_g < cost and is_goal(board, next_s):
+                            goal = next_s
+                            cost = next_g
+                            improved = True
+                        if next_s in closed:
+                            inconsistent.add(next_s)
+                            reopened += 1
+                        else:
+                            heappush(open_heap, (next_g + weight * next_h, -next_g, next_s))
+                            generated += 1
+            if improved and on_improvement is not None:
+                on_improvement(get_solution_path(board, goal, parents), weight)
+    if stats is not None:
+        stats.add("expansions", expansions)
+        stats.add("generated", generated)
+        stats.add("reopened", reopened)
+    if goal is None:
+        return []
+    with phase(stats, "reconstruction"):
+        return get_solution_path(board, goal, parents)
+
+if __name__ == "__main__":
+    # Example usage
+    domain_file = "src/pddl/lightsout_domain.pddl"
+    problem_file = "src/pddl/lightsout_problem.pddl"
+
+    solution = solve_board_anytime(domain_file, problem_file, time_limit=1.0,
+                                   on_improvement=lambda plan, weight: print(f"w={weight}: {len(plan) - 1} presses"))
+    print(solution)
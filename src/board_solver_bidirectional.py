@@ -0,0 +1,127 @@
+from bitboard import load_board, get_set_bits
+from board_solver import get_plan
+from board_solver_gf2 import is_solvable
+from instrumentation import phase
+
+# Largest number of cells the goal may leave unspecified, the backward search starts from every
+# completion of the goal
+MAX_FREE_CELLS = 16
+
+def solve_board_bidirectional(domain_file, problem_file, stats=None, max_expansions=None):
+    """
+    Solve a PDDL domain and problem file with a bidirectional breadth-first search.
+
+    Args:
+        domain_file (str): Path to the PDDL domain file.
+        problem_file (str): Path to the PDDL problem file.
+        stats (SearchStats): If given, filled with the search counters and phase times.
+        max_expansions (int): If given, give up after this many expansions on both sides together.
+
+    Returns:
+        list: The solution plan as (state, action) pairs, or [] if there is none.
+    """
+    board = load_board(domain_file, problem_file, stats=stats)
+    return bidirectional_search(board, stats, max_expansions)
+
+def bidirectional_search(board, stats=None, max_expansions=None):
+    """
+    Meet-in-the-middle breadth-first search from the initial state and the goal states at once.
+    Every press is its own inverse, so the backward search uses the same masks as the forward one.
+    Each step expands a whole layer of the side with the smaller frontier, and the shortest join
+    found in that layer is an optimal plan: a depth-d plan costs about two searches of depth d/2.
+
+    Returns:
+        list: The optimal plan as (state, action) pairs, or [] if there is none or the expansion
+        cap was reached first. A plan joined in the layer the cap cut short may not be optimal.
+    """
+    masks = board.masks
+    actions = range(len(masks))
+    # Each side maps its states to their neighbour towards its root and the press leading there
+    forward = {board.init: (None, None)}
+    backward = {goal: (None, None) for goal in get_goal_states(board)}
+    # Both frontiers of an unsolvable board would only run out once every state was seen
+    forward_frontier = [board.init] if is_solvable(board) else []
+    backward_frontier = list(backward)
+    expansions = generated = duplicates = 0
+    meeting = None
+    with phase(stats, "search"):
+        if board.init in backward:
+            meeting = board.init
+        while meeting is None and forward_frontier and backward_frontier and expansions != max_expansions:
+            # A side is exhausted once its frontier is empty: every reachable state was seen
+            if len(forward_frontier) <= len(backward_frontier):
+                frontier, seen, other = forward_frontier, forward, backward
+            else:
+                frontier, seen, other = backward_frontier, backward, forward
+            next_frontier = []
+            best = None
+            for state in frontier:
+                if expansions == max_expansions:
+                    break
+                expansions += 1
+                for action in actions:
+                    next_state = state ^ masks[action]
+                    if next_state in seen:
+                        duplicates += 1
+                        continue
+                    seen[next_state] = (state, action)
+                    next_frontier.append(next_state)
+                    generated += 1
+                    if next_state in other:
+                        length = get_depth(other, next_state)
+                        if best is None or length < best[0]:
+                            best = (length, next_state)
+            if best is not None:
+                meeting = best[1]
+            if seen is forward:
+                forward_frontier = next_frontier
+            else:
+                backward_frontier = next_frontier
+    if stats is not None:
+        stats.add("expansions", expansions)
+        stats.add("generated", generated)
+        stats.add("duplicates", duplicates)
+    if meeting is None:
+        return []
+    with phase(stats, "reconstruction"):
+        presses = get_presses(forward, meeting)
+        presses.reverse()
+        presses.extend(get_presses(backward, meeting))
+        return get_plan(board, board.init, presses)
+
+def get_goal_states(board):
+    n = len(board.cells)
+    free = get_set_bits(((1 << n) - 1) & ~board.goal)
+    if len(free) > MAX_FREE_CELLS:
+        raise ValueError(f"The goal leaves {len(free)} cells free, bidirectional search needs at most {MAX_FREE_CELLS}")
+    goals = []
+    for completion in range(1 << len(free)):
+        state = board.goal
+        for k, cell in enumerate(free):
+            if completion >> k & 1:
+                state |= 1 << cell
+        goals.append(state)
+    return goals
+
+def get_depth(seen, state):
+    depth = 0
+    while seen[state][0] is not None:
+        state = seen[state][0]
+        depth += 1
+    return depth
+
+def get_presses(seen, state):
+    # Presses from state back to the root of its side
+    presses = []
+    while seen[state][0] is not None:
+        state, action = seen[state]
+        presses.append(action)
+    return presses
+
+if __name__ == "__main__":
+    # Example usage
+    domain_file = "src/pddl/lightsout_domain.pddl"
+    problem_file = "src/pddl/lightsout_problem.pddl"
+
+    solution = solve_board_bidirectional(domain_file, problem_file)
+    print(solution)
@@ -0,0 +1,367 @@
+from bitboard import load_board, is_goal
+from board_solver import get_plan
+from board_solver_gf2 import is_solvable
+from heuristics import get_heuristic
+from instrumentation import phase
+from collections import OrderedDict
+from heapq import heappush, heappop, heapify
+from math import inf as infinity
+import sys
+
+# Rough cost of one stored state, used to turn a memory budget into a number of states. A
+# transposition table slot holds a pointer to the state int, g and an epoch byte; A* keeps the state
+# in g and parents, its parent tuple and at least one heap entry.
+TABLE_SLOT_SIZE = 10
+ASTAR_STATE_SIZE = 400
+
+DEFAULT_MEMORY_LIMIT = 256 * 2**20
+
+def solve_board_bounded(domain_file, problem_file, mode="ida", heuristic="toggle", memory_limit=DEFAULT_MEMORY_LIMIT, stats=None):
+    """
+    Solve a PDDL domain and problem file within a memory budget.
+
+    Args:
+        domain_file (str): Path to the PDDL domain file.
+        problem_file (str): Path to the PDDL problem file.
+        mode (str): "ida" for IDA* with a depth-preferred transposition table, "ida-lru" for IDA*
+            with an LRU one, or "astar" for memory-capped A*.
+        heuristic (str): Name of the heuristic, it must be admissible for the plan to be optimal.
+        memory_limit (int): Budget in bytes for the stored states.
+        stats (SearchStats): If given, filled with the search counters and phase times.
+
+    Returns:
+        list: The solution plan as (state, action) pairs, or [] if there is none.
+    """
+    board = load_board(domain_file, problem_file, stats=stats)
+    if mode == "astar":
+        return bounded_astar_search(board, heuristic, memory_limit, stats)
+    if mode in ("ida", "ida-lru"):
+        return ida_star_search(board, heuristic, memory_limit, "lru" if mode == "ida-lru" else "depth", stats)
+    raise ValueError(f"Unknown mode {mode} (expected ida, ida-lru or astar)")
+
+#--------------------------------------------------------------------------------------------------------#
+#------------------------------------------ TRANSPOSITION TABLES ----------------------------------------#
+#--------------------------------------------------------------------------------------------------------#
+
+# Both tables map a state to the smallest g it was reached with during the current IDA* iteration.
+# Reaching it again no cheaper cannot lead anywhere new, so the search prunes it. Entries only hold
+# for the bound they were found under, every iteration starts with clear().
+
+class DepthTable:
+    """
+    Slots indexed by the state hash, at most size of them. On a collision the entry reached with
+    the smaller g is kept, since it roots the larger subtree and pruning it again saves the most
+    work. The table starts small and grows fourfold whenever half its slots are in use, so a short
+    search never pays for the whole budget.
+    """
+
+    START_SIZE = 1024
+
+    def __init__(self, size):
+        self.max_size = size
+        self.allocate(min(size, self.START_SIZE))
+
+    def allocate(self, size):
+        self.size = size
+        self.states = [None] * size
+        self.g = bytearray(size)
+        # Slots written before the last clear are empty, so clearing does not touch the slots
+        self.epochs = bytearray(size)
+        self.epoch = 1
+        self.used = 0
+
+    def clear(self):
+        self.epoch += 1
+        self.used = 0
+        if self.epoch == 256:
+            self.epochs = bytearray(self.size)
+            self.epoch = 1
+
+    def grow(self):
+        entries = [(state, g) for state, g, epoch in zip(self.states, self.g, self.epochs) if epoch == self.epoch]
+        self.allocate(min(self.max_size, self.size * 4))
+        for state, g in entries:
+            self.put(state, g)
+
+    def get(self, state):
+        slot = hash(state) % self.size
+        if self.epochs[slot] == self.epoch and self.states[slot] == state:
+            return self.g[slot]
+        return None
+
+    def put(self, state, g):
+        if self.used * 2 >= self.size and self.size < self.max_size:
+            self.grow()
+        slot = hash(state) % self.size
+        if self.epochs[slot] != self.epoch:
+            self.used += 1
+        if self.epochs[slot] != self.epoch or self.states[slot] == state or g <= self.g[slot]:
+            self.states[slot] = state
+            self.g[slot] = min(g, 255)
+            self.epochs[slot] = self.epoch
+
+class LRUTable:
+    """
+    At most size entries, the least recently looked up one is evicted first.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+
+    def clear(self):
+        self.entries.clear()
+
+    def get(self, state):
+        g = self.entries.get(state)
+        if g is not None:
+            self.entries.move_to_end(state)
+        return g
+
+    def put(self, state, g):
+        self.entries[state] = g
+        self.entries.move_to_end(state)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+TABLES = {
+    "depth": DepthTable,
+    "lru": LRUTable,
+}
+
+#--------------------------------------------------------------------------------------------------------#
+#------------------------------------------ IDA* --------------------------------------------------------#
+#--------------------------------------------------------------------------------------------------------#
+
+def ida_star_search(board, heuristic="toggle", memory_limit=DEFAULT_MEMORY_LIMIT, replacement="depth", stats=None, max_expansions=None):
+    """
+    Iterative deepening A*: depth-first searches bounded by f = g + h, the bound growing to the
+    smallest f that exceeded it, with a transposition table pruning states already reached as
+    cheaply. Memory is the table plus the current path.
+
+    Returns:
+        list: The solution plan as (state, action) pairs, or [] if there is none or the expansion
+        cap was reached.
+    """
+    if replacement not in TABLES:
+        raise ValueError(f"Unknown replacement policy {replacement} (expected one of {', '.join(TABLES)})")
+    with phase(stats, "heuristic"):
+        h = get_heuristic(heuristic, board)
+    # LRU entries also pay for their dict and linked list nodes
+    entry_size = TABLE_SLOT_SIZE + sys.getsizeof(board.goal) + (0 if replacement == "depth" else 100)
+    # More slots than states would stay empty
+    size = max(1, min(memory_limit // entry_size, 1 << len(board.masks)))
+    masks = board.masks
+    actions = range(len(masks))
+    init = board.init
+    bound = h(init)
+    expansions = generated = duplicates = 0
+    path = None
+    table = TABLES[replacement](size)
+    with phase(stats, "search"):
+        if is_goal(board, init):
+            path = []
+        elif not is_solvable(board):
+            # A finite heuristic never lets the bounds of an unsolvable board reach infinity
+            bound = infinity
+        while path is None and bound < infinity and expansions != max_expansions:
+            table.clear()
+            table.put(init, 0)
+            next_bound = infinity
+            presses = []
+            # Each frame is a state, its g and the iterator over the presses left to try from it
+            stack = [(init, 0, iter(actions))]
+            while stack:
+                state, g, successors = stack[-1]
+                last = presses[-1] if presses else None
+                for action in successors:
+                    if action == last:
+                        continue
+                    next_state = state ^ masks[action]
+                    f = g + 1 + h(next_state)
+                    if f > bound:
+                        next_bound = min(next_bound, f)
+                        continue
+                    seen = table.get(next_state)
+                    if seen is not None and seen <= g + 1:
+                        duplicates += 1
+                        continue
+                    table.put(next_state, g + 1)
+                    generated += 1
+                    presses.append(action)
+                    if is_goal(board, next_state):
+                        path = presses
+                        break
+                    stack.append((next_state, g + 1, iter(actions)))
+                    expansions += 1
+                    break
+                else:
+                    stack.pop()
+                    if presses:
+                        presses.pop()
+                    continue
+                if path is not None or expansions == max_expansions:
+                    break
+            bound = next_bound
+    if stats is not None:
+        stats.add("expansions", expansions)
+        stats.add("generated", generated)
+        stats.add("duplicates", duplicates)
+    if path is None:
+        return []
+    with phase(stats, "reconstruction"):
+        return get_plan(board, init, path)
+
+#--------------------------------------------------------------------------------------------------------#
+#------------------------------------------ MEMORY-CAPPED A* --------------------------------------------#
+#--------------------------------------------------------------------------------------------------------#
+
+def bounded_astar_search(board, heuristic="toggle", memory_limit=DEFAULT_MEMORY_LIMIT, stats=None, max_expansions=None):
+    """
+    SMA*: A* that generates one successor at a time and forgets states when it runs out of memory.
+    A state whose successors have all been generated takes the smallest f among its children,
+    and that backed-up f climbs to its ancestors. When more states are stored than the budget
+    allows, the leaves with the largest f are dropped until a quarter of the budget is free again;
+    each one leaves its f on its parent, which regenerates that one child, and only it, if its f
+    ever becomes the smallest again.
+
+    Forgotten states can no longer be recognised as duplicates, so the search runs over press sets
+    rather than press sequences, as the ordered successors of astar_search: a node is a state and
+    the first press still allowed, and every set of presses is reached along a single path. The plan
+    is optimal with an admissible heuristic as long as the budget holds the nodes along it; nodes
+    as deep as the budget are treated as dead ends, so a budget shorter than every plan finds none.
+
+    Returns:
+        list: The solution plan as (state, action) pairs, or [] if there is none or the expansion
+        cap was reached.
+    """
+    with phase(stats, "heuristic"):
+        h = get_heuristic(heuristic, board)
+    capacity = max(2, memory_limit // (ASTAR_STATE_SIZE + sys.getsizeof(board.goal)))
+    masks = board.masks
+    n = len(masks)
+    goal_cells = board.goal
+    # Nodes are packed as state << shift | first press allowed
+    shift = n.bit_length()
+    reach = [0] * (n + 1)
+    for action in reversed(range(n)):
+        reach[action] = reach[action + 1] | masks[action]
+    init = board.init << shift
+    g = {init: 0}
+    f = {init: h(board.init)}
+    parents = {init: (None, None)}
+    # Next press to generate from every node, its stored children and the f of the forgotten ones
+    next_actions = {init: 0}
+    children = {init: set()}
+    forgotten = {init: {}}
+    # Unsolvable boards would only end once every press set was tried
+    open_heap = [(f[init], 0, init)] if is_solvable(board) else []
+    expansions = generated = reopened = duplicates = 0
+    goal = None
+    with phase(stats, "search"):
+        while open_heap:
+            best, neg_g, key = heappop(open_heap)
+            if best != f.get(key):
+                continue
+            if best == infinity:
+                break
+            if is_goal(board, key >> shift):
+                goal = key
+                break
+            if next_actions[key] == n and not forgotten[key]:
+                continue
+            if expansions == max_expansions:
+                break
+            expansions += 1
+            if next_actions[key] < n:
+                action = next_actions[key]
+                next_actions[key] += 1
+                backed_up = f[key]
+            else:
+                # Regenerate the best forgotten child, with the f it had when it was dropped
+                action = min(forgotten[key], key=forgotten[key].get)
+                backed_up = max(f[key], forgotten[key].pop(action))
+            next_s = key >> shift ^ masks[action]
+            next_key = next_s << shift | action + 1
+            next_g = g[key] + 1
+            if goal_cells & ~next_s & ~reach[action + 1]:
+                # A goal cell is off and no press left can switch it on
+                pass
+            elif next_g >= g.get(next_key, infinity):
+                duplicates += 1
+            else:
+                if next_key in g:
+                    # The same state through another press set of the same last press, move it here
+                    reopened += 1
+                    children[parents[next_key][0]].discard(next_key)
+                    backup(parents[next_key][0], f, g, parents, next_actions, children, forgotten, open_heap, n)
+                else:
+                    children[next_key] = set()
+                    forgotten[next_key] = {}
+                    generated += 1
+                next_f = max(backed_up, next_g + h(next_s))
+                if next_g >= capacity - 1 and not is_goal(board, next_s):
+                    # Too deep for the budget to hold the path to anything below it
+                    next_f = infinity
+                g[next_key] = next_g
+                f[next_key] = next_f
+                parents[next_key] = (key, action)
+                next_actions[next_key] = action + 1
+                children[key].add(next_key)
+                heappush(open_heap, (next_f, -next_g, next_key))
+            backup(key, f, g, parents, next_actions, children, forgotten, open_heap, n)
+            if next_actions[key] < n or forgotten[key]:
+                heappush(open_heap, (f[key], -g[key], key))
+            if len(g) > capacity:
+                forget_states(init, f, g, parents, next_actions, children, forgotten, open_heap, capacity * 3 // 4)
+    if stats is not None:
+        stats.add("expansions", expansions)
+        stats.add("generated", generated)
+        stats.add("reopened", reopened)
+        stats.add("duplicates", duplicates)
+    if goal is None:
+        return []
+    with phase(stats, "reconstruction"):
+        presses = []
+        while parents[goal][0] is not None:
+            goal, action = parents[goal]
+            presses.append(action)
+        presses.reverse()
+        return get_plan(board, board.init, presses)
+
+def backup(s, f, g, parents, next_actions, children, forgotten, open_heap, n):
+    # Once every successor of a state was generated, its f is the best f below it
+    while s is not None and next_actions[s] == n:
+        best = min(min((f[child] for child in children[s]), default=infinity), min(forgotten[s].values(), default=infinity))
+        if best == f[s]:
+            break
+        f[s] = best
+        if forgotten[s]:
+            heappush(open_heap, (best, -g[s], s))
+        s = parents[s][0]
+
+def forget_states(init, f, g, parents, next_actions, children, forgotten, open_heap, target):
+    while len(g) > target:
+        # Leaves, the worst f first and the shallowest among equal ones
+        leaves = sorted((s for s in g if not children[s] and s != init), key=lambda s: (f[s], -g[s]))
+        if not leaves:
+            break
+        while len(g) > target and leaves:
+            s = leaves.pop()
+            parent, action = parents[s]
+            forgotten[parent][action] = f[s]
+            children[parent].discard(s)
+            for table in (f, g, parents, next_actions, children, forgotten):
+                del table[s]
+            heappush(open_heap, (f[parent], -g[parent], parent))
+    # Drop the entries of forgotten states, so the open list stays as small as memory
+    open_heap[:] = [entry for entry in open_heap if f.get(entry[2]) == entry[0]]
+    heapify(open_heap)
+
+if __name__ == "__main__":
+    # Example usage
+    domain_file = "src/pddl/lightsout_domain.pddl"
+    problem_file = "src/pddl/lightsout_problem.pddl"
+
+    solution = solve_board_bounded(domain_file, problem_file, mode="ida", memory_limit=64 * 2**20)
+    print(solution)
@@ -0,0 +1,103 @@
+from bitboard import load_board, get_set_bits
+from board_solver import get_plan
+from instrumentation import phase
+
+def solve_board_gf2(domain_file, problem_file, max_nullity=20, stats=None):
+    """
+    Solve a PDDL domain and problem file as a linear system over GF(2).
+
+    Args:
+        domain_file (str): Path to the PDDL domain file.
+        problem_file (str): Path to the PDDL problem file.
+        max_nullity (int): Largest null space enumerated exhaustively for the minimum-press solution.
+        stats (SearchStats): If given, filled with the parse, ground, search and reconstruction times.
+
+    Returns:
+        list: The solution plan as (state, action) pairs, or [] if the board is unsolvable.
+    """
+    board = load_board(domain_file, problem_file, stats=stats)
+    with phase(stats, "search"):
+        presses = get_press_set(board, max_nullity)
+    if presses is None:
+        return []
+    with phase(stats, "reconstruction"):
+        return get_plan(board, board.init, get_set_bits(presses))
+
+def get_press_set(board, max_nullity=20):
+    """
+    Find a set of presses that reaches the goal of a board. It is a minimum one whenever the null
+    space has at most max_nullity dimensions, otherwise it is only improved greedily.
+
+    Returns:
+        int: Bitmask of the cells to press, or None if the board is unsolvable.
+    """
+    n = len(board.cells)
+    pivots = get_echelon_rows(board)
+    if pivots is None:
+        return None
+    free = [i for i in range(n) if i not in pivots]
+    presses = back_substitute(pivots, n, 0)
+    null_space = [back_substitute(pivots, n, 1 << f, rhs=False) for f in free]
+    return minimize_presses(presses, null_space, max_nullity)
+
+def is_solvable(board):
+    return get_echelon_rows(board) is not None
+
+def get_echelon_rows(board):
+    # Row i is the equation for goal cell i: the presses that toggle it, with the toggle it needs at bit n
+    n = len(board.cells)
+    rows = [0] * n
+    for j, mask in enumerate(board.masks):
+        for i in get_set_bits(mask):
+            rows[i] |= 1 << j
+    coefficients = (1 << n) - 1
+    pivots = {}
+    for i in get_set_bits(board.goal):
+        row = rows[i] | (~board.init >> i & 1) << n
+        # Each row is keyed by its lowest set bit, so reducing it only ever moves that bit up
+        while row & coefficients:
+            low = (row & -row).bit_length() - 1
+            if low not in pivots:
+                pivots[low] = row
+                break
+            row ^= pivots[low]
+        else:
+            if row:
+                return None
+    return pivots
+
+def back_substitute(pivots, n, presses, rhs=True):
+    for pivot in sorted(pivots, reverse=True):
+        row = pivots[pivot]
+        bit = (row & presses).bit_count() & 1
+        if rhs:
+            bit ^= row >> n & 1
+        presses |= bit << pivot
+    return presses
+
+def minimize_presses(presses, null_space, max_nullity):
+    if len(null_space) <= max_nullity:
+        # Walk every coset element in Gray code order, one XOR per step
+        best = presses
+        current = presses
+        for k in range(1, 1 << len(null_space)):
+            current ^= null_space[(k & -k).bit_length() - 1]
+            if current.bit_count() < best.bit_count():
+                best = current
+        return best
+    improved = True
+    while improved:
+        improved = False
+        for vector in null_space:
+            if (presses ^ vector).bit_count() < presses.bit_count():
+                presses ^= vector
+                improved = True
+    return presses
+
+if __name__ == "__main__":
+    # Example usage
+    domain_file = "src/pddl/lightsout_domain.pddl"
+    problem_file = "src/pddl/lightsout_problem.pddl"
+
+    solution = solve_board_gf2(domain_file, problem_file)
+    print(solution)
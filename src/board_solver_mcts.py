@@ -1,235 +1,308 @@
-from parsers import parse_domain, parse_problem, Constant, UnaryPredicate, BinaryPredicate, Action, Domain, Effect
-from math import inf as infinity
-from collections import defaultdict
-from Node import Node
+from bitboard import load_board, is_goal
+from board_solver import get_plan, SUCCESSORS
+from heuristics import get_heuristic
+from instrumentation import phase
+from math import sqrt, log
+from time import perf_counter
 import random
 
-def mcts_algorithm(domain_file, problem_file, k, tries):
-    values = None
-    for i in range(tries):
-        for j in range(k):
-            if i==0 and j==0:
-                values = mcts_iteration(domain_file, problem_file)
-            else:
-                values = mcts_iteration(domain_file, problem_file, values, extra_selections=i)
-    return values
-
-def mcts_iteration(domain_file, problem_file, mcts_value=None, extra_selections=0):
+def mcts_algorithm(domain_file, problem_file, k, tries, rollout="greedy", time_limit=None, seed=None, stats=None, successors="all"):
     """
-    Solve a PDDL domain and problem file using the unified-planning library.
-    
+    Solve a PDDL domain and problem file with UCT Monte Carlo tree search.
+
     Args:
         domain_file (str): Path to the PDDL domain file.
         problem_file (str): Path to the PDDL problem file.
+        k (int): Iterations per try.
+        tries (int): Number of tries, the search runs k * tries iterations in total.
+        rollout (str): Rollout policy, "random" or "greedy".
+        time_limit (float): Optional wall-clock budget in seconds.
+        seed (int): Seed of the search random generator.
+        stats (SearchStats): If given, filled with the rollout and tree counters and phase times.
+        successors (str): Successor policy, "all" presses or only the "ordered" ones after the last.
 
     Returns:
-        str: The solution plan as a string.
+        list: The best solution plan found as (state, action) pairs, or [] if none was found.
+    """
+    # Parse and compile once, every iteration shares the same board
+    board = load_board(domain_file, problem_file, stats=stats)
+    search = MCTS(board, rollout=rollout, seed=seed, stats=stats, successors=successors)
+    return search.run(iterations=k * tries, time_limit=time_limit)
+
+class TreeNode:
+    __slots__ = ("state", "parent", "action", "depth", "children", "untried", "visits", "value")
+
+    def __init__(self, state, parent=None, action=None, untried=()):
+        self.state = state
+        self.parent = parent
+        self.action = action
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.children = []
+        self.untried = list(untried)
+        self.visits = 0
+        self.value = 0.0
+
+class MCTS:
     """
+    UCT search tree over a compiled board, kept between calls to run so that more compute keeps
+    improving the same tree.
+
+    Rewards are in [0, 1]: a rollout that switches every goal cell on scores 0.5 plus a bonus that
+    shrinks with the plan length, and one that does not scores at most 0.5, in proportion to the
+    goal cells it got on.
+    """
+
+    ROLLOUTS = ("random", "greedy")
+
+    def __init__(self, board, rollout="greedy", exploration=sqrt(2), max_depth=None, seed=None, stats=None, symmetry=False, successors="all", rollout_batch=None):
+        if rollout not in self.ROLLOUTS:
+            raise ValueError(f"Unknown rollout policy {rollout} (expected one of {', '.join(self.ROLLOUTS)})")
+        if successors not in SUCCESSORS:
+            raise ValueError(f"Unknown successor policy {successors} (expected one of {', '.join(SUCCESSORS)})")
+        if symmetry and successors == "ordered":
+            raise ValueError("Symmetry reduction permutes the cells, it cannot be combined with ordered successors")
+        self.board = board
+        self.rollout_policy = rollout
+        self.exploration = exploration
+        # No optimal plan presses a cell twice, so the number of cells bounds every useful plan
+        self.max_depth = len(board.cells) if max_depth is None else max_depth
+        self.random = random.Random(seed)
+        self.h = get_heuristic("count", board)
+        # With ordered successors, the tree and the rollouts only press cells after the last press
+        self.ordered = successors == "ordered"
+        self.reach = None
+        if self.ordered:
+            self.reach = [0] * (len(board.masks) + 1)
+            for action in reversed(range(len(board.masks))):
+                self.reach[action] = self.reach[action + 1] | board.masks[action]
+        self.canonical = None
+        if symmetry:
+            # Siblings whose states are symmetric have the same value, only one of them is expanded
+            from symmetry import get_symmetries, make_canonical
+            self.canonical = make_canonical(board, get_symmetries(board))
+        self.root = TreeNode(board.init, untried=self.get_actions(board.init, None))
+        self.best_presses = None
+        self.iterations = 0
+        self.tree_size = 1
+        self.tree_depth = 0
+        # Root statistics of other trees added to the root children, see share_root_stats
+        self.shared = {}
+        # SearchStats, filled at the end of every run
+        self.stats = stats
+        # With rollout_batch, every iteration plays that many rollouts from its leaf at once on a
+        # BatchSimulator, which needs NumPy
+        self.rollout_batch = rollout_batch
+        if rollout_batch is not None:
+            if self.ordered:
+                raise ValueError("Batched rollouts only play unordered presses")
+            import numpy as np
+            from simulator import BatchSimulator
+            self.simulator = BatchSimulator(board)
+            self.numpy_random = np.random.default_rng(self.random.getrandbits(64))
+
+    def run(self, iterations=None, time_limit=None):
+        """
+        Grow the tree until the iteration or time budget runs out, at least one must be given.
+
+        Returns:
+            list: The best plan found so far, see best_plan.
+        """
+        if iterations is None and time_limit is None:
+            raise ValueError("Either iterations or time_limit must be given")
+        deadline = None if time_limit is None else perf_counter() + time_limit
+        stats = self.stats
+        sample_every = None if stats is None else stats.sample_every
+        tree_size = self.tree_size
+        rollouts = self.iterations
+        done = 0
+        with phase(stats, "search"):
+            while (iterations is None or done < iterations) and (deadline is None or perf_counter() < deadline):
+                self.iterate()
+                done += 1
+                if sample_every and done % sample_every == 0:
+                    stats.sample({"iterations": self.iterations, "tree_size": self.tree_size, "tree_depth": self.tree_depth,
+                                  "best": None if self.best_presses is None else len(self.best_presses)})
+        if stats is not None:
+            stats.add("rollouts", self.iterations - rollouts)
+            stats.add("expansions", self.tree_size - tree_size)
+            stats.maximum("tree_depth", self.tree_depth)
+        with phase(stats, "reconstruction"):
+            return self.best_plan()
+
+    def iterate(self):
+        node = self.select_and_expand()
+        if self.rollout_batch is not None:
+            rewards, presses = self.simulator.rollouts(node.state, node.depth, node.action, self.rollout_batch,
+                                                       self.max_depth, self.numpy_random, self.rollout_policy)
+            if presses is not None:
+                self.record_plan(node, presses)
+            self.backpropagate(node, float(rewards.sum()), self.rollout_batch)
+            return
+        reward, presses = self.simulate(node.state, node.depth, node.action)
+        if presses is not None:
+            self.record_plan(node, presses)
+        self.backpropagate(node, reward)
+
+    def select_and_expand(self):
+        # Selection
+        node = self.root
+        while not node.untried and node.children:
+            node = self.select_child(node)
+        # Expansion
+        if node.untried and not is_goal(self.board, node.state):
+            action = node.untried.pop()
+            state = node.state ^ self.board.masks[action]
+            child = TreeNode(state, node, action, self.get_actions(state, action))
+            node.children.append(child)
+            node = child
+            self.tree_size += 1
+            if node.depth > self.tree_depth:
+                self.tree_depth = node.depth
+        return node
 
-    # Parse the domain and problem files
-    domain = parse_domain(domain_file)
-    problem = parse_problem(problem_file)
-    cells = get_cells(domain)
-    actions = []
-    for cell in cells:
-        actions.append(f"press_cell {cell}")
-    adjacencies = set()
-    for predicate in problem.init:
-        if isinstance(predicate, BinaryPredicate):
-            adjacencies.add(frozenset([predicate.parameter1, predicate.parameter2]))
-    goal_cells = get_cells_on(problem.goal)
-    # Initialize the MCTS algorithm
-    initial_cells_on = frozenset(get_cells_on(problem.init))
-    nodes = set()
-    nodes.add(Node(initial_cells_on, None, None))
-    value = 0
-    path = []
-    if mcts_value == None:
-        mcts_value = defaultdict(int)
-    # Selection
-    states_sequence = [initial_cells_on]
-    visited_states = {initial_cells_on}
-    for i in range(3):
-        action = random.choice(actions)
-        new_state = frozenset(apply_action(domain.actions, states_sequence[i], action, adjacencies))
-        states_sequence.append(new_state)
-        visited_states.add(new_state)
-        nodes.add(Node(new_state, states_sequence[i], action))
-    if extra_selections > 0:
-        for i in range(extra_selections):
-            min_value = infinity
-            next_state = None
-            action_to_take = None
+    def backpropagate(self, node, reward, visits=1):
+        # Several rollouts from the same leaf can be backed up at once, with their total reward
+        while node is not None:
+            node.visits += visits
+            node.value += reward
+            node = node.parent
+        self.iterations += visits
+
+    def select_child(self, node):
+        log_visits = log(node.visits)
+        best = None
+        best_score = -1.0
+        for child in node.children:
+            score = child.value / child.visits + self.exploration * sqrt(log_visits / child.visits)
+            if score > best_score:
+                best = child
+                best_score = score
+        return best
+
+    def simulate(self, state, depth, last):
+        """
+        Play presses from a state at the given depth until the goal or the depth limit.
+
+        Returns:
+            tuple: The reward, and the presses made if they reached the goal or else None.
+        """
+        board = self.board
+        masks = board.masks
+        presses = []
+        best_deficit = (board.goal & ~state).bit_count()
+        while not is_goal(board, state) and depth + len(presses) < self.max_depth:
+            if self.ordered:
+                actions = self.get_ordered_actions(state, last)
+                if not actions:
+                    break
+            if self.rollout_policy == "greedy":
+                action = self.get_greedy_action(state, last)
+            elif self.ordered:
+                action = self.random.choice(actions)
+            else:
+                action = self.random.randrange(len(masks) if last is None else len(masks) - 1)
+                # Skip the previous press, which would only undo it
+                if last is not None and action >= last:
+                    action += 1
+            state ^= masks[action]
+            presses.append(action)
+            last = action
+            best_deficit = min(best_deficit, (board.goal & ~state).bit_count())
+        if is_goal(board, state):
+            length = depth + len(presses)
+            return 0.5 + 0.5 * (1 - length / (self.max_depth + 1)), presses
+        return 0.5 * (1 - best_deficit / max(board.goal.bit_count(), 1)), None
+
+    def get_greedy_action(self, state, last):
+        best_actions = []
+        best_h = None
+        actions = self.get_ordered_actions(state, last) if self.ordered else range(len(self.board.masks))
+        for action in actions:
+            if action == last:
+                continue
+            value = self.h(state ^ self.board.masks[action])
+            if best_h is None or value < best_h:
+                best_actions = [action]
+                best_h = value
+            elif value == best_h:
+                best_actions.append(action)
+        return self.random.choice(best_actions)
+
+    def get_actions(self, state, last):
+        if self.ordered:
+            actions = self.get_ordered_actions(state, last)
+        else:
+            actions = [action for action in range(len(self.board.masks)) if action != last]
+        if self.canonical is not None:
+            successors = set()
+            unique = []
             for action in actions:
-                new_state = frozenset(apply_action(domain.actions, states_sequence[-1], action, adjacencies))
-                if mcts_value[new_state] < min_value:
-                    min_value = mcts_value[new_state]
-                    next_state = new_state
-                    action_to_take = action
-            states_sequence.append(next_state)
-            visited_states.add(next_state)
-            nodes.add(Node(next_state, states_sequence[-1], action_to_take))
-    # Expansion
-    expansion_state = None
-    while expansion_state == None or expansion_state in visited_states:
-        new_action = random.choice(actions)
-        expansion_state = frozenset(apply_action(domain.actions, states_sequence[-1], new_action, adjacencies))
-    states_sequence.append(expansion_state)
-    visited_states.add(expansion_state)
-    # Simulation
-    g = defaultdict(lambda: infinity)
-    g[initial_cells_on] = 0
-    f = defaultdict(lambda: infinity)
-    h = get_h_add(cells, expansion_state)
-    f[initial_cells_on] = h
-    f = defaultdict(lambda: infinity)
-    h = get_h_add(cells, expansion_state)
-    f[initial_cells_on] = h
-    closed = set()
-    open_states = {expansion_state}
-    for i in range(5*5):
-        s = min(open_states, key=lambda x: f[x])
-        visited_states.add(s)
-        states_sequence.append(s)
-        open_states.remove(s)
-        closed.add(s)
-        if goal_cells in s:
-            path = get_solution_path(s, None, nodes)
-        elif s in visited_states:
-            value = -1
-            break
+                successor = self.canonical(state ^ self.board.masks[action])[0]
+                if successor not in successors:
+                    successors.add(successor)
+                    unique.append(action)
+            actions = unique
+        self.random.shuffle(actions)
+        return actions
+
+    def get_ordered_actions(self, state, last):
+        # Presses after the last one that leave every off goal cell within reach of the presses after them
+        goal = self.board.goal
+        masks = self.board.masks
+        reach = self.reach
+        return [action for action in range(0 if last is None else last + 1, len(masks))
+                if not goal & ~(state ^ masks[action]) & ~reach[action + 1]]
+
+    def record_plan(self, node, presses):
+        actions = list(presses)
+        while node.parent is not None:
+            actions.append(node.action)
+            node = node.parent
+        # Presses commute and cancel in pairs, so only the ones made an odd number of times matter
+        odd = set()
         for action in actions:
-            next_s = frozenset(apply_action(domain.actions,s, action, adjacencies))
-            node = Node(next_s, s, action)
-            if next_s in open_states and g[s] + 1 < g[next_s]:
-                if node in nodes:
-                    nodes.remove(node)
-                nodes.add(node)
-                g[next_s] = g[s] + 1
-                f[next_s] = g[next_s] + get_h_add(cells, next_s)
-            elif next_s in closed and g[s] + 1 < g[next_s]:
-                if node in nodes:
-                    nodes.remove(node)
-                nodes.add(node)
-                g[next_s] = g[s] + 1
-                f[next_s] = g[next_s] + get_h_add(cells, next_s)
-                closed.remove(next_s)
-                open_states.add(next_s)
-            elif next_s not in open_states and next_s not in closed:
-                if node in nodes:
-                    nodes.remove(node)
-                nodes.add(node)
-                g[next_s] = g[s] + 1
-                f[next_s] = g[next_s] + get_h_add(cells, next_s)
-                open_states.add(next_s)
-    # Retropropagation
-    if len(path) > 0:
-        value = 26-len(path)
-    mcts_value[states_sequence[-1]] = value
-    for i in range(len(states_sequence) - 2, -1, -1):
-        mcts_value[states_sequence[i]] = mcts_value[states_sequence[i + 1]]/states_sequence.count(states_sequence[i])
-    return mcts_value
-    
-def get_h_add(cells, state):
-    res = 0
-    for cell in cells:
-        if cell not in state:
-            res += 1
-    return res
-
-def get_cells_on(predicates):
-    res = set()
-    for fact in predicates:
-        if isinstance(fact, UnaryPredicate) and fact.name == "cell_on":
-            res.add(fact.parameter)
-    return res
-
-def get_cells(domain):
-    res = set()
-    for constant in domain.constants:
-        if constant.type == "cell":
-            res.add(constant.name)
-    return res
-
-def apply_action(actions, state, action, adjacencies):
-    obj = action.split(" ")
-    action_name = obj[0]
-    cell = obj[1]
-    action_effects = get_action_effects(actions, state, action_name, cell, adjacencies)
-    new_state = set(state)
-    for effect in action_effects:
-        for eff in effect.effects:
-            if eff.positive:
-                new_state.add(eff.parameter)
-            else:
-                new_state.remove(eff.parameter)
-    return new_state
-
-def get_action_effects(actions, state, action_name, cell, adjacencies):
-    res = []
-    for action in actions:
-        if action.name == action_name:
-            for effect in action.effects:
-                parsed_conditions = []
-                skip = True
-                conditions = effect.conditions
-                if len(conditions) == 1:
-                    condition = conditions[0]
-                    if isinstance(condition, UnaryPredicate):
-                        if condition.parameter == "c":
-                            condition = UnaryPredicate(condition.name, cell, condition.positive)
-                            if condition.parameter in state and condition.positive or condition.parameter not in state and not condition.positive:
-                                parsed_conditions.append(condition)
-                else:
-                    for condition in conditions:
-                        if isinstance(condition, UnaryPredicate):
-                            if condition.parameter == "c":
-                                parsed_conditions.append(UnaryPredicate(condition.name, cell, condition.positive))
-                            if (condition.parameter in state and condition.positive or condition.parameter not in state and not condition.positive) and {cell, condition.parameter} in adjacencies:
-                                parsed_conditions.append(condition)
-                            else:
-                                continue
-                        elif isinstance(condition, BinaryPredicate):
-                            if condition.parameter1 == "c" and {cell, condition.parameter2} in adjacencies:
-                                parsed_conditions.append(BinaryPredicate(condition.name, cell, condition.parameter2, condition.positive))
-                            elif condition.parameter2 == "c" and {cell, condition.parameter1} in adjacencies:
-                                parsed_conditions.append(BinaryPredicate(condition.name, condition.parameter1, cell, condition.positive))
-                for parsed_condition in parsed_conditions:
-                    if isinstance(parsed_condition, UnaryPredicate):
-                        skip = False
-                if skip:
-                    continue
-                parsed_effects = []
-                effects = effect.effects
-                for eff in effects:
-                    if eff.parameter == "c":
-                        parsed_effects.append(UnaryPredicate(eff.name, cell, eff.positive))
-                    else:
-                        parsed_effects.append(eff)
-                res.append(Effect(parsed_conditions, parsed_effects))
-    return res
-
-def get_solution_path(state, action, nodes):
-    path = []
-    node = get_equal(nodes, state)
-    if node is None:
-        raise ValueError("State not found in nodes")
-    father, father_action = node.father
-    if father is not None:
-        path = get_solution_path(father, father_action, nodes)
-    path.append((state, action))
-    return path
-
-def get_equal(in_set, in_element):
-   for element in in_set:
-       if element == in_element:
-           return element
-   return None
+            odd ^= {action}
+        if self.best_presses is None or len(odd) < len(self.best_presses):
+            self.best_presses = sorted(odd)
+
+    def best_plan(self):
+        """
+        Returns:
+            list: The shortest plan found so far as (state, action) pairs, or [] if none was found.
+        """
+        if self.best_presses is None:
+            return []
+        return get_plan(self.board, self.board.init, self.best_presses)
+
+    def root_stats(self):
+        # Visits and total value of every root action, the statistics root-parallel workers share
+        shared = self.shared
+        return {child.action: (child.visits - shared.get(child.action, (0, 0.0))[0],
+                               child.value - shared.get(child.action, (0, 0.0))[1]) for child in self.root.children}
+
+    def share_root_stats(self, others):
+        """
+        Add the root statistics of other trees to the root children, in place of the ones added by
+        the last call, so that selection at the root follows every tree. root_stats still returns
+        the statistics of this tree alone.
+
+        Args:
+            others (dict): The summed {action: (visits, value)} root statistics of the other trees.
+        """
+        shared = {}
+        for child in self.root.children:
+            old_visits, old_value = self.shared.get(child.action, (0, 0.0))
+            visits, value = others.get(child.action, (0, 0.0))
+            child.visits += visits - old_visits
+            child.value += value - old_value
+            self.root.visits += visits - old_visits
+            shared[child.action] = (visits, value)
+        self.shared = shared
 
 if __name__ == "__main__":
     # Example usage
     domain_file = "src/pddl/lightsout_domain.pddl"
     problem_file = "src/pddl/lightsout_problem.pddl"
-    
+
     solution = mcts_algorithm(domain_file, problem_file, k=5, tries=10)
-    print(solution)
\ No newline at end of file
+    print(solution)
@@ -0,0 +1,149 @@
+import hashlib
+import multiprocessing
+from bitboard import load_board
+from board_solver import get_plan
+from board_solver_mcts import MCTS
+
+def parallel_mcts_algorithm(domain_file, problem_file, workers, iterations, mode="root", rollout="greedy", seed=0, **kwargs):
+    """
+    Solve a PDDL domain and problem file with MCTS spread over a pool of processes.
+
+    Args:
+        domain_file (str): Path to the PDDL domain file.
+        problem_file (str): Path to the PDDL problem file.
+        workers (int): Number of worker processes.
+        iterations (int): Rollouts per worker in root mode, rollouts in total in leaf mode.
+        mode (str): "root" for trees that share their root statistics every round, "leaf" for one
+            tree whose rollouts are batched over the pool.
+        rollout (str): Rollout policy, "random" or "greedy".
+        seed (int): Master seed, every worker and batch seed is derived from it.
+
+    Returns:
+        list: The best solution plan found as (state, action) pairs, or [] if none was found.
+    """
+    board = load_board(domain_file, problem_file)
+    if mode == "root":
+        plan, _ = root_parallel_mcts(board, workers, iterations, rollout, seed, **kwargs)
+        return plan
+    elif mode == "leaf":
+        return leaf_parallel_mcts(board, workers, iterations, rollout, seed, **kwargs)
+    raise ValueError(f"Unknown parallel mode {mode} (expected root or leaf)")
+
+def derive_seed(seed, *path):
+    # Stable across runs and processes, unlike hash() of a tuple
+    digest = hashlib.sha256(repr((seed,) + path).encode()).digest()
+    return int.from_bytes(digest[:8], "little")
+
+#--------------------------------------------------------------------------------------------------------#
+#------------------------------------------ ROOT PARALLELISM --------------------------------------------#
+#--------------------------------------------------------------------------------------------------------#
+
+def root_parallel_mcts(board, workers, iterations, rollout="greedy", seed=0, rounds=10):
+    """
+    Grow one tree per worker process from the initial state. After every round the root
+    statistics of all trees are summed, and every worker gets the sum over the other trees, which
+    its root selection then follows, and the shortest plan found.
+
+    Returns:
+        tuple: The best plan found, and the merged {action: (visits, value)} root statistics.
+    """
+    connections = []
+    processes = []
+    for i in range(workers):
+        parent_end, worker_end = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=root_worker, args=(worker_end, board, rollout, derive_seed(seed, "root", i)), daemon=True)
+        process.start()
+        connections.append(parent_end)
+        processes.append(process)
+    best_presses = None
+    merged = {}
+    worker_stats = [{} for _ in connections]
+    try:
+        for round_index in range(rounds):
+            round_iterations = iterations * (round_index + 1) // rounds - iterations * round_index // rounds
+            for connection, stats in zip(connections, worker_stats):
+                others = {action: (visits - stats.get(action, (0, 0.0))[0], value - stats.get(action, (0, 0.0))[1])
+                          for action, (visits, value) in merged.items()}
+                connection.send((round_iterations, best_presses, others))
+            merged = {}
+            for k, connection in enumerate(connections):
+                stats, presses = connection.recv()
+                worker_stats[k] = stats
+                for action, (visits, value) in stats.items():
+                    total_visits, total_value = merged.get(action, (0, 0.0))
+                    merged[action] = (total_visits + visits, total_value + value)
+                if presses is not None and (best_presses is None or len(presses) < len(best_presses)):
+                    best_presses = presses
+    finally:
+        for connection in connections:
+            connection.send(None)
+        for process in processes:
+            process.join()
+    plan = [] if best_presses is None else get_plan(board, board.init, best_presses)
+    return plan, merged
+
+def root_worker(connection, board, rollout, seed):
+    search = MCTS(board, rollout=rollout, seed=seed)
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        iterations, best_presses, others = message
+        if best_presses is not None and (search.best_presses is None or len(best_presses) < len(search.best_presses)):
+            search.best_presses = best_presses
+        search.share_root_stats(others)
+        search.run(iterations=iterations)
+        connection.send((search.root_stats(), search.best_presses))
+
+#--------------------------------------------------------------------------------------------------------#
+#------------------------------------------ LEAF PARALLELISM --------------------------------------------#
+#--------------------------------------------------------------------------------------------------------#
+
+def leaf_parallel_mcts(board, workers, iterations, rollout="greedy", seed=0, batch_size=None):
+    """
+    Grow a single tree in this process and play the rollouts of a batch of leaves at once on a
+    pool, a share of the batch per worker. Every selected leaf takes a virtual loss, a visit
+    without reward, so the next selections of the batch spread over other leaves.
+    """
+    batch_size = 64 * workers if batch_size is None else batch_size
+    search = MCTS(board, rollout=rollout, seed=derive_seed(seed, "tree"))
+    with multiprocessing.Pool(workers, initializer=init_leaf_worker, initargs=(board, rollout)) as pool:
+        batch = 0
+        while search.iterations < iterations:
+            leaves = []
+            for _ in range(min(batch_size, iterations - search.iterations)):
+                node = search.select_and_expand()
+                search.backpropagate(node, 0.0)
+                leaves.append(node)
+            tasks = [(node.state, node.depth, node.action, derive_seed(seed, "leaf", batch, i)) for i, node in enumerate(leaves)]
+            chunk = -(-len(tasks) // workers)
+            results = [result for chunk_results in pool.map(leaf_rollouts, [tasks[k:k + chunk] for k in range(0, len(tasks), chunk)])
+                       for result in chunk_results]
+            for node, (reward, presses) in zip(leaves, results):
+                if presses is not None:
+                    search.record_plan(node, presses)
+                # The visit was counted with the virtual loss
+                search.backpropagate(node, reward, 0)
+            batch += 1
+    return search.best_plan()
+
+worker_search = None
+
+def init_leaf_worker(board, rollout):
+    global worker_search
+    worker_search = MCTS(board, rollout=rollout)
+
+def leaf_rollouts(tasks):
+    results = []
+    for state, depth, last, seed in tasks:
+        worker_search.random.seed(seed)
+        results.append(worker_search.simulate(state, depth, last))
+    return results
+
+if __name__ == "__main__":
+    # Example usage
+    domain_file = "src/pddl/lightsout_domain.pddl"
+    problem_file = "src/pddl/lightsout_problem.pddl"
+
+    solution = parallel_mcts_algorithm(domain_file, problem_file, workers=multiprocessing.cpu_count(), iterations=200)
+    print(solution)
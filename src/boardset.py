@@ -0,0 +1,279 @@
+import os
+import sys
+import mmap
+import struct
+import argparse
+from bitboard import Board, get_set_bits
+
+# A board set holds many boards of one geometry in a single binary file:
+#   header   magic, version, flags, cell count, toggle count, names size and record size
+#   geometry goal bitset, toggle lists in CSR form (cells + 1 offsets, then the toggled cells)
+#            and the cell names and action name, newline separated
+#   records  one per board: its initial state as a little-endian bitset, followed with
+#            SOLUTIONS by the bitset of a press set solving it and a status byte
+# Records have a fixed size and their count follows from the file size, so appending a board
+# never touches what was written before, and a reader can map the file and slice records out.
+
+MAGIC = b"LOBS"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIII")
+OFFSET = struct.Struct("<I")
+
+# Flags
+SOLUTIONS = 1
+
+# Status of a solution record
+UNKNOWN = 0
+SOLVED = 1
+UNSOLVABLE = 2
+
+def get_width(n):
+    return max(1, (n + 7) // 8)
+
+class BoardSetWriter:
+    """
+    Append boards to a board set, creating it with the geometry of board if it does not exist
+    yet. Appending to an existing set checks that the geometries match.
+
+    Args:
+        path (str): Path to the board set.
+        board (Board): Geometry of the boards, its initial state is ignored.
+        solutions (bool): Store a solution record with every board.
+    """
+
+    def __init__(self, path, board, solutions=False):
+        self.width = get_width(len(board.cells))
+        self.flags = SOLUTIONS if solutions else 0
+        header = get_header(board, self.flags)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as file:
+                if file.read(len(header)) != header:
+                    raise ValueError(f"{path} holds boards of another geometry or format")
+            self.file = open(path, "r+b")
+            # Drop a record cut short by an interrupted append
+            size = os.path.getsize(path)
+            self.file.truncate(size - (size - len(header)) % self.get_record_size())
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.file = open(path, "wb")
+            self.file.write(header)
+
+    def get_record_size(self):
+        return self.width * 2 + 1 if self.flags & SOLUTIONS else self.width
+
+    def append(self, state, presses=None, status=None):
+        """
+        Append a board.
+
+        Args:
+            state (int): Initial state of the board.
+            presses (int): Bitset of a press set solving it, if the set stores solutions.
+            status (int): UNKNOWN, SOLVED or UNSOLVABLE, by default SOLVED if presses is given.
+        """
+        record = state.to_bytes(self.width, "little")
+        if self.flags & SOLUTIONS:
+            if status is None:
+                status = UNKNOWN if presses is None else SOLVED
+            record += (presses or 0).to_bytes(self.width, "little") + bytes([status])
+        elif presses is not None:
+            raise ValueError("This board set stores no solutions")
+        self.file.write(record)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def get_header(board, flags):
+    n = len(board.cells)
+    toggles = [get_set_bits(mask) for mask in board.masks]
+    names = "\n".join(board.cells + (board.action,)).encode()
+    width = get_width(n)
+    record_size = width * 2 + 1 if flags & SOLUTIONS else width
+    parts = [HEADER.pack(MAGIC, VERSION, flags, n, sum(map(len, toggles)), len(names), record_size),
+             board.goal.to_bytes(width, "little")]
+    offset = 0
+    offsets = [OFFSET.pack(0)]
+    for cells in toggles:
+        offset += len(cells)
+        offsets.append(OFFSET.pack(offset))
+    parts.extend(offsets)
+    parts.extend(OFFSET.pack(cell) for cells in toggles for cell in cells)
+    parts.append(names)
+    return b"".join(parts)
+
+class BoardSetReader:
+    """
+    Memory-mapped board set. Records are read as memoryviews into the mapping, without copies;
+    a mapping still viewed when the reader is closed is unmapped once its last view is dropped.
+
+    Args:
+        path (str): Path to the board set.
+
+    Attributes:
+        board (Board): Geometry of the boards, with an empty initial state.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        if len(self.map) < HEADER.size or HEADER.unpack_from(self.map)[:2] != (MAGIC, VERSION):
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} board set")
+        _, _, self.flags, n, toggle_count, names_size, self.record_size = HEADER.unpack_from(self.map)
+        self.width = get_width(n)
+        offset = HEADER.size
+        goal = int.from_bytes(self.map[offset:offset + self.width], "little")
+        offset += self.width
+        offsets = struct.unpack_from(f"<{n + 1}I", self.map, offset)
+        offset += OFFSET.size * (n + 1)
+        cells = struct.unpack_from(f"<{toggle_count}I", self.map, offset)
+        offset += OFFSET.size * toggle_count
+        masks = []
+        for i in range(n):
+            mask = 0
+            for cell in cells[offsets[i]:offsets[i + 1]]:
+                mask |= 1 << cell
+            masks.append(mask)
+        *names, action = self.map[offset:offset + names_size].decode().split("\n")
+        self.start = offset + names_size
+        self.board = Board(tuple(names), tuple(masks), 0, goal, action)
+
+    def __len__(self):
+        return (len(self.map) - self.start) // self.record_size
+
+    def __getitem__(self, k):
+        # The state bitset of board k
+        if not 0 <= k < len(self):
+            raise IndexError(f"Board {k} out of range for {len(self)} boards")
+        start = self.start + k * self.record_size
+        return self.view[start:start + self.width]
+
+    def __iter__(self):
+        return (self[k] for k in range(len(self)))
+
+    def get_state(self, k):
+        return int.from_bytes(self[k], "little")
+
+    def get_solution(self, k):
+        """
+        Returns:
+            tuple: The status of the solution record of board k and its press set bitset.
+        """
+        if not self.flags & SOLUTIONS:
+            return UNKNOWN, None
+        start = self.start + k * self.record_size + self.width
+        status = self.map[start + self.width]
+        return status, int.from_bytes(self.map[start:start + self.width], "little") if status == SOLVED else None
+
+    def boards(self):
+        # Every board compiled for the solvers, sharing the geometry of the set
+        for k in range(len(self)):
+            yield self.board._replace(init=self.get_state(k))
+
+    def close(self):
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+#--------------------------------------------------------------------------------------------------------#
+#------------------------------------------ PDDL CONVERSION ---------------------------------------------#
+#--------------------------------------------------------------------------------------------------------#
+
+def pack_pddl(domain_file, problem_files, path, solve=False):
+    """
+    Write PDDL problems sharing a domain to a board set, parsing the domain once. Every problem
+    must have the same adjacency and goal.
+
+    Args:
+        domain_file (str): Path to the PDDL domain file.
+        problem_files (list): Paths to the PDDL problem files.
+        path (str): Path to the board set, appended to if it exists.
+        solve (bool): Store a minimum press set of every board, found with GF(2) elimination.
+
+    Returns:
+        int: Number of boards written.
+    """
+    from parsers import parse_domain, parse_problem
+    from bitboard import compile_board
+    from board_solver_gf2 import get_press_set
+    domain = parse_domain(domain_file)
+    writer = None
+    try:
+        for problem_file in problem_files:
+            board = compile_board(domain, parse_problem(problem_file))
+            if writer is None:
+                writer = BoardSetWriter(path, board, solutions=solve)
+                geometry = board._replace(init=0)
+            elif board._replace(init=0) != geometry:
+                raise ValueError(f"{problem_file} does not share the geometry of {problem_files[0]}")
+            if solve:
+                presses = get_press_set(board)
+                writer.append(board.init, presses, UNSOLVABLE if presses is None else SOLVED)
+            else:
+                writer.append(board.init)
+    finally:
+        if writer is not None:
+            writer.close()
+    return len(problem_files)
+
+def unpack_pddl(path, output_dir):
+    """
+    Write a board set back to a shared PDDL domain and one problem file per board.
+
+    Returns:
+        int: Number of boards written.
+    """
+    from generator import write_domain, write_problem
+    os.makedirs(output_dir, exist_ok=True)
+    with BoardSetReader(path) as reader:
+        write_domain(reader.board, os.path.join(output_dir, "lightsout_domain.pddl"))
+        width = len(str(len(reader) - 1))
+        for k, board in enumerate(reader.boards()):
+            write_problem(board, os.path.join(output_dir, f"lightsout_problem_{k:0{width}d}.pddl"))
+        return len(reader)
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Convert between PDDL problems and binary board sets.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack_parser = subparsers.add_parser("pack", help="append PDDL problems sharing a domain to a board set")
+    pack_parser.add_argument("output", help="board set file")
+    pack_parser.add_argument("domain", help="PDDL domain file")
+    pack_parser.add_argument("problems", nargs="+", help="PDDL problem files")
+    pack_parser.add_argument("--solve", action="store_true", help="store a minimum press set of every board")
+    unpack_parser = subparsers.add_parser("unpack", help="write a board set back to PDDL")
+    unpack_parser.add_argument("input", help="board set file")
+    unpack_parser.add_argument("output_dir", help="directory of the domain and problem files")
+    info_parser = subparsers.add_parser("info", help="describe a board set")
+    info_parser.add_argument("input", help="board set file")
+    return parser
+
+def main(argv=None):
+    options = get_parser().parse_args(argv)
+    if options.command == "pack":
+        count = pack_pddl(options.domain, options.problems, options.output, options.solve)
+        print(f"Packed {count} boards into {options.output}", file=sys.stderr)
+    elif options.command == "unpack":
+        count = unpack_pddl(options.input, options.output_dir)
+        print(f"Unpacked {count} boards into {options.output_dir}", file=sys.stderr)
+    else:
+        with BoardSetReader(options.input) as reader:
+            print(f"{len(reader)} boards of {len(reader.board.cells)} cells, {reader.record_size} bytes each"
+                  + (", with solutions" if reader.flags & SOLUTIONS else ""))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
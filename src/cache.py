@@ -0,0 +1,27 @@
+import os
+import hashlib
+
+def get_cache_dir():
+    # Shared by every on-disk cache, override with LIGHTSOUT_CACHE
+    path = os.environ.get("LIGHTSOUT_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "lightsout"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def get_cache_path(kind, key, extension):
+    directory = os.path.join(get_cache_dir(), kind)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{key}.{extension}")
+
+def get_geometry_key(board, *extra):
+    # Boards sharing their cells, toggle masks and goal share every precomputed table
+    digest = hashlib.sha256()
+    digest.update(repr((board.cells, board.masks, board.goal) + extra).encode())
+    return digest.hexdigest()[:32]
+
+def write_atomic(path, chunks):
+    # Readers never see a partial file, even with several processes filling the same cache
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        for chunk in chunks:
+            file.write(chunk)
+    os.replace(tmp_path, path)
@@ -0,0 +1,420 @@
+import sys
+import json
+import asyncio
+import argparse
+import multiprocessing
+from collections import OrderedDict, deque
+from time import perf_counter
+from batch import get_geometry, solve_description
+from symmetry import get_symmetries, make_canonical
+
+# A long-running solver behind a minimal HTTP/1.1 server on localhost or a Unix socket:
+#   POST /solve    {"rows": r, "cols": c, "topology": t, "on": [cells], "solver": ..., "timeout": ...}
+#   GET  /metrics  latency percentiles, cache and coalescing counters
+# Boards are solved up to symmetry: the cache and the in-flight requests are keyed by the
+# canonical form of the initial state, and plans are mapped back onto each requested board.
+
+SOLVERS = ("gf2", "astar", "mcts")
+LATENCY_WINDOW = 10000
+# Geometries kept with their symmetries, by rows, columns and topology
+GEOMETRY_CACHE = 64
+
+def get_symmetric_geometry(rows, cols, topology="grid"):
+    board, index = get_geometry(rows, cols, topology)
+    symmetries = get_symmetries(board)
+    return board, index, symmetries, make_canonical(board, symmetries)
+
+#--------------------------------------------------------------------------------------------------------#
+#------------------------------------------ WORKERS -----------------------------------------------------#
+#--------------------------------------------------------------------------------------------------------#
+
+def worker_loop(connection):
+    # Every worker keeps its own geometries warm between requests, see batch.get_geometry
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            return
+        description, options = task
+        try:
+            result = solve_description(description, **options)
+        except (ValueError, KeyError, TypeError, IndexError) as error:
+            result = {"error": f"{type(error).__name__}: {error}"}
+        connection.send(result)
+
+class WorkerPool:
+    """
+    Worker processes fed over pipes from the event loop. A search that is cancelled or runs past
+    its timeout is stopped for real: its worker is killed and replaced by a fresh one. Workers are
+    started from a fork server, or spawned, rather than forked from the daemon, which holds client
+    sockets by then.
+    """
+
+    def __init__(self, workers):
+        methods = multiprocessing.get_all_start_methods()
+        self.context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self.idle = asyncio.Queue()
+        self.workers = []
+        for _ in range(workers):
+            self.idle.put_nowait(self.spawn())
+
+    def spawn(self):
+        parent_end, worker_end = self.context.Pipe()
+        process = self.context.Process(target=worker_loop, args=(worker_end,), daemon=True)
+        process.start()
+        worker_end.close()
+        worker = (process, parent_end)
+        self.workers.append(worker)
+        return worker
+
+    def kill(self, worker):
+        process, connection = worker
+        process.kill()
+        process.join()
+        connection.close()
+        self.workers.remove(worker)
+
+    async def run(self, task, timeout=None):
+        worker = await self.idle.get()
+        process, connection = worker
+        loop = asyncio.get_running_loop()
+        result = loop.create_future()
+        def on_readable():
+            loop.remove_reader(connection.fileno())
+            try:
+                result.set_result(connection.recv())
+            except (EOFError, OSError) as error:
+                result.set_exception(error)
+        loop.add_reader(connection.fileno(), on_readable)
+        try:
+            connection.send(task)
+            value = await asyncio.wait_for(result, timeout)
+        except BaseException:
+            # Timed out, cancelled or the worker died: it may still be searching, replace it
+            loop.remove_reader(connection.fileno())
+            self.kill(worker)
+            self.idle.put_nowait(self.spawn())
+            raise
+        self.idle.put_nowait(worker)
+        return value
+
+    def close(self):
+        for worker in list(self.workers):
+            self.kill(worker)
+
+#--------------------------------------------------------------------------------------------------------#
+#------------------------------------------ PLAN CACHE --------------------------------------------------#
+#--------------------------------------------------------------------------------------------------------#
+
+class PlanCache:
+    """
+    LRU cache of results under a memory cap, with entry sizes estimated from their contents.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        size = get_entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (value, size)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= evicted
+
+def get_entry_size(key, value):
+    # Key tuple and canonical state, result dict, presses list and small ints
+    state = key[2]
+    presses = value.get("presses") or []
+    return 400 + state.bit_length() // 8 + 40 * len(presses)
+
+#--------------------------------------------------------------------------------------------------------#
+#------------------------------------------ SERVER ------------------------------------------------------#
+#--------------------------------------------------------------------------------------------------------#
+
+class SolverDaemon:
+    """
+    Args:
+        workers (int): Worker processes.
+        cache_bytes (int): Memory cap of the plan cache.
+        timeout (float): Default per-request timeout in seconds, None for no timeout.
+        options (dict): Default solver options, see batch.solve_description.
+    """
+
+    def __init__(self, workers=1, cache_bytes=64 * 2**20, timeout=10.0, **options):
+        self.pool = WorkerPool(workers)
+        self.cache = PlanCache(cache_bytes)
+        self.timeout = timeout
+        self.options = options
+        self.in_flight = {}
+        # Requests waiting on every search in flight, a search nobody waits for is cancelled
+        self.waiters = {}
+        self.geometries = OrderedDict()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = dict.fromkeys(("requests", "hits", "misses", "coalesced", "timeouts", "errors"), 0)
+
+    async def solve(self, request):
+        """
+        Solve one board request, from the cache, alongside an identical request in flight, or on
+        a worker.
+
+        Returns:
+            dict: The id, whether it was solved, its cost and plan, and how it was answered.
+        """
+        start = perf_counter()
+        self.counters["requests"] += 1
+        try:
+            return await self.get_response(request, start)
+        finally:
+            self.latencies.append(perf_counter() - start)
+
+    async def get_response(self, request, start):
+        rows = request["rows"]
+        cols = request.get("cols", rows)
+        topology = request.get("topology", "grid")
+        timeout = request.get("timeout", self.timeout)
+        try:
+            board, index, symmetries, canonical = await asyncio.wait_for(self.get_geometry(rows, cols, topology), timeout)
+        except asyncio.TimeoutError:
+            self.counters["timeouts"] += 1
+            raise
+        init = 0
+        for cell in request.get("on", []):
+            init |= 1 << (cell if isinstance(cell, int) else index[cell])
+        if init >> len(board.cells):
+            raise ValueError(f"Cell index out of range for a {rows}x{cols} board")
+        state, transform = canonical(init)
+        options = dict(self.options)
+        options.update((name, request[name]) for name in ("solver", "heuristic", "max_expansions", "iterations", "seed") if name in request)
+        if options.get("solver", "gf2") not in SOLVERS:
+            raise ValueError(f"Unknown solver {options['solver']} (expected one of {', '.join(SOLVERS)})")
+        if timeout is not None:
+            # The geometry counts against the timeout of the request that waited for it
+            timeout = max(0, timeout - (perf_counter() - start))
+        key = (rows, cols, state, topology) + tuple(sorted(options.items()))
+        response = {"id": request.get("id"), "cached": False, "coalesced": False}
+        result = self.cache.get(key)
+        if result is not None:
+            self.counters["hits"] += 1
+            response["cached"] = True
+        else:
+            self.counters["misses"] += 1
+            task = self.in_flight.get(key)
+            if task is not None:
+                self.counters["coalesced"] += 1
+                response["coalesced"] = True
+            else:
+                description = {"rows": rows, "cols": cols, "topology": topology, "on": [i for i in range(len(board.cells)) if state >> i & 1]}
+                task = asyncio.ensure_future(self.run_search(key, description, options, index))
+                self.in_flight[key] = task
+                self.waiters[key] = 0
+                task.add_done_callback(lambda done: self.finish_search(key, done))
+            # Shielded, so one waiter giving up does not cancel the search the others wait for: the
+            # search runs as long as its most patient waiter and each waiter keeps its own timeout
+            self.waiters[key] += 1
+            try:
+                result = await asyncio.wait_for(asyncio.shield(task), timeout)
+            except asyncio.TimeoutError:
+                self.counters["timeouts"] += 1
+                raise
+            finally:
+                if not task.done():
+                    self.waiters[key] -= 1
+                    if not self.waiters[key]:
+                        task.cancel()
+        if "error" in result:
+            raise ValueError(result["error"])
+        # The cached presses solve the canonical state, the inverse symmetry maps them back
+        permutation = symmetries[transform]
+        inverse = [0] * len(permutation)
+        for cell, image in enumerate(permutation):
+            inverse[image] = cell
+        presses = result["presses"]
+        response.update(
+            solved=result["solved"],
+            cost=result["cost"],
+            plan=None if presses is None else [board.cells[inverse[press]] for press in presses],
+            time=perf_counter() - start,
+        )
+        return response
+
+    async def get_geometry(self, rows, cols, topology):
+        # Symmetries of a new geometry take a while, they are found off the event loop, once for
+        # every request waiting on them
+        key = (rows, cols, topology)
+        future = self.geometries.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(None, get_symmetric_geometry, rows, cols, topology)
+            self.geometries[key] = future
+            future.add_done_callback(lambda done: self.drop_geometry(key, done))
+            while len(self.geometries) > GEOMETRY_CACHE:
+                self.geometries.popitem(last=False)
+        else:
+            self.geometries.move_to_end(key)
+        # Shielded, so a request timing out does not cancel the geometry for the others
+        return await asyncio.shield(future)
+
+    def drop_geometry(self, key, future):
+        if (future.cancelled() or future.exception() is not None) and self.geometries.get(key) is future:
+            del self.geometries[key]
+
+    def finish_search(self, key, task):
+        del self.in_flight[key]
+        del self.waiters[key]
+        # Read the error of a search whose waiters all gave up, so asyncio does not log it
+        if not task.cancelled():
+            task.exception()
+
+    async def run_search(self, key, description, options, index):
+        result = await self.pool.run((description, options))
+        if "error" not in result:
+            plan = result["plan"]
+            result = {"solved": result["solved"], "cost": result["cost"],
+                      "presses": None if plan is None else [index[cell] for cell in plan]}
+            self.cache.put(key, result)
+        return result
+
+    def get_metrics(self):
+        latencies = sorted(self.latencies)
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return dict(
+            self.counters,
+            hit_rate=self.counters["hits"] / lookups if lookups else None,
+            p50_ms=get_percentile(latencies, 0.50) * 1000 if latencies else None,
+            p99_ms=get_percentile(latencies, 0.99) * 1000 if latencies else None,
+            cache_entries=len(self.cache.entries),
+            cache_bytes=self.cache.size,
+            in_flight=len(self.in_flight),
+        )
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except ValueError as error:
+                    # The stream cannot be trusted past a malformed request, answer it and hang up
+                    self.counters["errors"] += 1
+                    await write_response(writer, "400 Bad Request", {"error": f"Malformed request: {error}"}, False)
+                    break
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                status, payload = await self.route(method, path, body)
+                await write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body):
+        if method == "GET" and path == "/metrics":
+            return "200 OK", self.get_metrics()
+        if method != "POST" or path != "/solve":
+            return "404 Not Found", {"error": f"No route for {method} {path}"}
+        try:
+            return "200 OK", await self.solve(json.loads(body))
+        except asyncio.TimeoutError:
+            return "504 Gateway Timeout", {"error": "timeout"}
+        except (ValueError, KeyError, TypeError, IndexError) as error:
+            self.counters["errors"] += 1
+            return "400 Bad Request", {"error": f"{type(error).__name__}: {error}"}
+
+async def read_request(reader):
+    """
+    Read one HTTP request.
+
+    Returns:
+        tuple: Its method, path, body and whether the connection stays open, or None at the end
+        of the stream.
+
+    Raises:
+        ValueError: If the request line or the content length is malformed.
+    """
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    parts = line.decode("latin-1").split()
+    if len(parts) != 3:
+        raise ValueError(f"request line {line.strip()[:80]!r}")
+    method, path, version = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length < 0:
+        raise ValueError(f"content length {length}")
+    body = await reader.readexactly(length)
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+    return method, path, body, keep_alive
+
+async def write_response(writer, status, payload, keep_alive):
+    data = json.dumps(payload).encode()
+    writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+    await writer.drain()
+
+def get_percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+async def serve(options):
+    daemon = SolverDaemon(options.workers, options.cache_mb * 2**20, options.timeout, solver=options.solver,
+                          heuristic=options.heuristic, max_expansions=options.max_expansions,
+                          iterations=options.iterations, seed=options.seed)
+    if options.unix:
+        server = await asyncio.start_unix_server(daemon.handle_connection, options.unix)
+    else:
+        server = await asyncio.start_server(daemon.handle_connection, options.host, options.port)
+    address = options.unix or f"http://{options.host}:{options.port}"
+    print(f"Serving on {address}", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        daemon.pool.close()
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Serve Lights Out solves over HTTP on localhost or a Unix socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--timeout", type=float, default=10.0, help="default per-request timeout in seconds")
+    parser.add_argument("--cache-mb", type=int, default=64, help="memory cap of the plan cache in MiB")
+    parser.add_argument("--solver", choices=SOLVERS, default="gf2")
+    parser.add_argument("--heuristic", default="chase", help="A* heuristic")
+    parser.add_argument("--max-expansions", type=int, default=None, help="A* expansion cap")
+    parser.add_argument("--iterations", type=int, default=1000, help="MCTS iterations")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser
+
+def main(argv=None):
+    options = get_parser().parse_args(argv)
+    try:
+        asyncio.run(serve(options))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
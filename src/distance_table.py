@@ -0,0 +1,241 @@
+import os
+import sys
+import mmap
+import struct
+import argparse
+import multiprocessing
+from math import inf as infinity
+from cache import get_cache_path, get_geometry_key
+from instrumentation import phase
+
+# The optimal distance of every state of a small board, from a breadth-first search backwards
+# from the goal states over every press. The table file holds, after its header:
+#   distances  one 4-bit entry per state, two states a byte, the lower one in the low nibble;
+#              SATURATED stands for a distance of at least SATURATED, or no plan at all
+#   actions    one byte per state: an optimal press, GOAL on goal states and NONE when the goal
+#              cannot be reached
+# Following the actions from any state plays an optimal plan, so solving is a table walk.
+
+MAGIC = b"LODST1"
+# Magic, number of cells, largest distance
+HEADER = struct.Struct("<6sHI")
+MAX_CELLS = 28
+SATURATED = 15
+GOAL = 0xFE
+NONE = 0xFF
+# States a worker expands at a time
+CHUNK = 1 << 20
+
+def load_distance_table(board, workers=1, stats=None):
+    """
+    Get the distance table of a board, building and saving it the first time its geometry is seen.
+
+    Args:
+        board (Board): Compiled board with at most MAX_CELLS cells.
+        workers (int): Processes expanding the frontier while the table is built.
+        stats (SearchStats): If given, filled with the search counters and phase times of the build.
+
+    Returns:
+        DistanceTable: The memory-mapped table.
+    """
+    n = len(board.cells)
+    if n > MAX_CELLS:
+        raise ValueError(f"The board has {n} cells, distance tables are limited to {MAX_CELLS}")
+    path = get_cache_path("distances", get_geometry_key(board), "dist")
+    if not os.path.exists(path):
+        build_distance_table(board, path, workers, stats)
+    return DistanceTable(path, board)
+
+class DistanceTable:
+    """
+    Read-only view of a distance table file, shared between every process that maps it.
+
+    Args:
+        path (str): Path to the table.
+        board (Board): Board of the geometry the table was built for.
+    """
+
+    def __init__(self, path, board):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n, self.max_distance = HEADER.unpack_from(self.map)
+        if magic != MAGIC or n != len(board.cells):
+            raise ValueError(f"{path} is not a distance table for this board")
+        view = memoryview(self.map)
+        size = 1 << n
+        self.distances = view[HEADER.size:HEADER.size + max(1, size // 2)]
+        self.actions = view[HEADER.size + len(self.distances):HEADER.size + len(self.distances) + size]
+        self.masks = board.masks
+
+    def get_distance(self, state):
+        """
+        Returns:
+            int: The number of presses of an optimal plan from state, or infinity if there is none.
+        """
+        distance = self.distances[state >> 1] >> (state & 1) * 4 & 0xF
+        if distance < SATURATED:
+            return distance
+        if self.actions[state] == NONE:
+            return infinity
+        return len(self.get_actions(state))
+
+    def get_action(self, state):
+        # The first press of an optimal plan, None at the goal or if there is no plan
+        action = self.actions[state]
+        return None if action in (GOAL, NONE) else action
+
+    def get_actions(self, state):
+        """
+        Returns:
+            list: The presses of an optimal plan from state, or None if there is none.
+        """
+        actions = self.actions
+        masks = self.masks
+        if actions[state] == NONE:
+            return None
+        res = []
+        while actions[state] != GOAL:
+            res.append(actions[state])
+            state ^= masks[actions[state]]
+        return res
+
+#--------------------------------------------------------------------------------------------------------#
+#------------------------------------------ CONSTRUCTION ------------------------------------------------#
+#--------------------------------------------------------------------------------------------------------#
+
+# Read by expand_chunk, in the builder or in every pool worker
+worker_tables = {}
+
+def init_worker(path, n, masks):
+    import numpy as np
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    offset = HEADER.size + max(1, (1 << n) // 2)
+    worker_tables["actions"] = np.frombuffer(data, np.uint8, 1 << n, offset)
+    worker_tables["masks"] = masks
+
+def expand_chunk(frontier):
+    # Successors of part of the frontier not seen when the level started, by press; the table is
+    # only written by the builder, which drops those found twice in the same level
+    actions = worker_tables["actions"]
+    res = []
+    for action, mask in enumerate(worker_tables["masks"]):
+        states = frontier ^ mask
+        res.append((action, states[actions[states] == NONE]))
+    return res
+
+def build_distance_table(board, path, workers=1, stats=None):
+    """
+    Level-synchronous breadth-first search from every goal state, on NumPy arrays of whole levels.
+    Presses are their own inverse, so a state first reached from the frontier by a press is
+    optimally solved by the same press. Workers expand chunks of each level against the shared
+    file mapping, and this process alone writes the table, so the table also marks the states
+    seen and a level never holds a state twice.
+    """
+    import numpy as np
+    n = len(board.cells)
+    size = 1 << n
+    nibbles = max(1, size // 2)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, n, 0))
+        file.truncate(HEADER.size + nibbles + size)
+    with open(tmp_path, "r+b") as file:
+        data = mmap.mmap(file.fileno(), 0)
+    distances = np.frombuffer(data, np.uint8, nibbles, HEADER.size)
+    actions = np.frombuffer(data, np.uint8, size, HEADER.size + nibbles)
+    distances[:] = 0xFF
+    actions[:] = NONE
+    masks = np.array(board.masks, dtype=np.uint32)
+    frontier = get_goal_states(board)
+    actions[frontier] = GOAL
+    set_distances(distances, frontier, 0)
+    expansions = generated = duplicates = 0
+    depth = 0
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, initializer=init_worker, initargs=(tmp_path, n, masks))
+    else:
+        init_worker(tmp_path, n, masks)
+    try:
+        with phase(stats, "search"):
+            while len(frontier):
+                expansions += len(frontier)
+                chunk = max(1, min(CHUNK, -(-len(frontier) // workers)))
+                chunks = [frontier[k:k + chunk] for k in range(0, len(frontier), chunk)]
+                level = []
+                results = map(expand_chunk, chunks) if pool is None else pool.imap_unordered(expand_chunk, chunks)
+                for candidates in results:
+                    for action, states in candidates:
+                        fresh = states[actions[states] == NONE]
+                        duplicates += len(states) - len(fresh)
+                        actions[fresh] = action
+                        level.append(fresh)
+                frontier = np.concatenate(level) if level else frontier[:0]
+                generated += len(frontier)
+                if len(frontier):
+                    depth += 1
+                    set_distances(distances, frontier, min(depth, SATURATED))
+    except BaseException:
+        del distances, actions
+        data.close()
+        os.remove(tmp_path)
+        raise
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        worker_tables.clear()
+    if stats is not None:
+        stats.add("expansions", expansions)
+        stats.add("generated", generated)
+        stats.add("duplicates", duplicates)
+    HEADER.pack_into(data, 0, MAGIC, n, depth)
+    del distances, actions
+    data.flush()
+    data.close()
+    os.replace(tmp_path, path)
+
+def get_goal_states(board):
+    import numpy as np
+    from bitboard import get_set_bits
+    states = np.array([board.goal], dtype=np.uint32)
+    for cell in get_set_bits(((1 << len(board.cells)) - 1) & ~board.goal):
+        states = np.concatenate([states, states | np.uint32(1 << cell)])
+    return states
+
+def set_distances(distances, states, distance):
+    # States are distinct, so the even ones, then the odd ones, each write distinct bytes
+    even = states[states & 1 == 0] >> 1
+    distances[even] = distances[even] & 0xF0 | distance
+    odd = states[states & 1 == 1] >> 1
+    distances[odd] = distances[odd] & 0x0F | distance << 4
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Precompute the optimal distance table of a board geometry.")
+    parser.add_argument("domain", nargs="?", help="PDDL domain file")
+    parser.add_argument("problem", nargs="?", help="PDDL problem file")
+    parser.add_argument("--rows", type=int, help="a generated board instead of PDDL files")
+    parser.add_argument("--cols", type=int, default=None, help="defaults to --rows")
+    parser.add_argument("--topology", default="grid", help="shape of the generated board, see topology.py")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    return parser
+
+def main(argv=None):
+    parser = get_parser()
+    options = parser.parse_args(argv)
+    if options.problem is not None:
+        from bitboard import load_board
+        board = load_board(options.domain, options.problem)
+    elif options.rows is not None and options.domain is None:
+        from batch import get_geometry
+        cols = options.rows if options.cols is None else options.cols
+        board, _ = get_geometry(options.rows, cols, options.topology)
+    else:
+        parser.error("give a PDDL domain and problem, or --rows")
+    table = load_distance_table(board, options.workers)
+    print(f"{len(board.cells)} cells, largest distance {table.max_distance}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
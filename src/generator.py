@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import random
+import argparse
+from topology import TOPOLOGIES, get_board
+
+def generate_boards(rows, cols, seed=0, density=0.5, count=1, solvable=False, topology="grid"):
+    """
+    Generate compiled boards without building any PDDL.
+
+    Args:
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+        seed (int): Seed of the generator, the same seed always gives the same boards.
+        density (float): Probability of each cell starting on, or of each cell being pressed when
+            scrambling a solvable board.
+        count (int): Number of boards.
+        solvable (bool): Scramble the boards from the goal state, so that all of them are solvable.
+        topology (str): Shape of the board, see topology.TOPOLOGIES.
+
+    Yields:
+        Board: The compiled boards.
+    """
+    rng = random.Random(seed)
+    board = get_board(TOPOLOGIES[topology](rows, cols))
+    for _ in range(count):
+        if solvable:
+            state = board.goal
+            for mask in board.masks:
+                if rng.random() < density:
+                    state ^= mask
+        else:
+            state = 0
+            for i in range(len(board.cells)):
+                if rng.random() < density:
+                    state |= 1 << i
+        yield board._replace(init=state)
+
+def get_adjacent_pairs(board):
+    # Each unordered pair once, lower index first, as the cell_adjacent facts are written
+    for i, mask in enumerate(board.masks):
+        mask >>= i + 1
+        while mask:
+            low = mask & -mask
+            yield i, i + low.bit_length()
+            mask ^= low
+
+#--------------------------------------------------------------------------------------------------------#
+#------------------------------------------ PDDL WRITING ------------------------------------------------#
+#--------------------------------------------------------------------------------------------------------#
+
+# Same layout as the files PDDLWriter produces from lights_out_board.py, written piece by piece
+# so that large boards never hold the whole text in memory
+
+def write_domain(board, file_path):
+    cells = board.cells
+    with open(file_path, "w") as file:
+        file.write("(define (domain lightsoutboard-domain)\n")
+        file.write(" (:requirements :strips :typing :conditional-effects)\n")
+        file.write(" (:types cell)\n")
+        file.write(" (:constants\n   ")
+        file.write(" ".join(cells))
+        file.write(" - cell\n )\n")
+        file.write(" (:predicates (cell_on ?c - cell) (cell_adjacent ?c1 - cell ?c2 - cell))\n")
+        file.write(f" (:action {board.action}\n")
+        file.write("  :parameters ( ?c - cell)\n")
+        if len(cells) > 1:
+            file.write(f"  :precondition (and (cell_adjacent {cells[0]} {cells[1]}))\n")
+        file.write("  :effect (and (when (not (cell_on ?c)) (cell_on ?c)) (when (cell_on ?c) (not (cell_on ?c)))")
+        for cell in cells:
+            file.write(f" (when (and (cell_adjacent ?c {cell}) (not (cell_on {cell}))) (cell_on {cell}))")
+            file.write(f" (when (and (cell_adjacent ?c {cell}) (cell_on {cell})) (not (cell_on {cell})))")
+        file.write("))\n)\n")
+
+def write_problem(board, file_path):
+    cells = board.cells
+    with open(file_path, "w") as file:
+        file.write("(define (problem lightsoutboard-problem)\n")
+        file.write(" (:domain lightsoutboard-domain)\n")
+        file.write(" (:objects\n )\n")
+        file.write(" (:init")
+        for i, cell in enumerate(cells):
+            if board.init >> i & 1:
+                file.write(f" (cell_on {cell})")
+        for i, j in get_adjacent_pairs(board):
+            file.write(f" (cell_adjacent {cells[i]} {cells[j]})")
+        file.write(")\n (:goal (and")
+        for i, cell in enumerate(cells):
+            if board.goal >> i & 1:
+                file.write(f" (cell_on {cell})")
+        file.write("))\n)\n")
+
+def get_board_description(board, rows, cols, topology="grid"):
+    # One JSON line per board, the format read back by the batch solver
+    description = {"rows": rows, "cols": cols, "on": [cell for i, cell in enumerate(board.cells) if board.init >> i & 1]}
+    if topology != "grid":
+        description["topology"] = topology
+    return description
+
+def get_parser():
+    parser = argparse.ArgumentParser(description="Generate random Lights Out boards.")
+    parser.add_argument("--rows", type=int, default=5)
+    parser.add_argument("--cols", type=int, default=None, help="defaults to --rows")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--topology", choices=TOPOLOGIES, default="grid")
+    parser.add_argument("--density", type=float, default=0.5)
+    parser.add_argument("--count", type=int, default=1)
+    parser.add_argument("--solvable", action="store_true", help="scramble from the goal so every board is solvable")
+    parser.add_argument("--output-dir", help="write a shared domain and one PDDL problem per board here "
+                                             "instead of JSON lines on stdout")
+    parser.add_argument("--boardset", help="append the boards to this binary board set instead, see boardset.py")
+    return parser
+
+def main(argv=None):
+    options = get_parser().parse_args(argv)
+    cols = options.rows if options.cols is None else options.cols
+    boards = generate_boards(options.rows, cols, options.seed, options.density, options.count, options.solvable,
+                             options.topology)
+    if options.boardset is not None:
+        from boardset import BoardSetWriter
+        geometry = get_board(TOPOLOGIES[options.topology](options.rows, cols))
+        with BoardSetWriter(options.boardset, geometry) as writer:
+            for board in boards:
+                writer.append(board.init)
+        return 0
+    if options.output_dir is None:
+        for board in boards:
+            sys.stdout.write(json.dumps(get_board_description(board, options.rows, cols, options.topology)) + "\n")
+        return 0
+    os.makedirs(options.output_dir, exist_ok=True)
+    width = len(str(options.count - 1))
+    for k, board in enumerate(boards):
+        if k == 0:
+            # Every board shares its geometry, so one domain file serves all the problems
+            write_domain(board, os.path.join(options.output_dir, "lightsout_domain.pddl"))
+        write_problem(board, os.path.join(options.output_dir, f"lightsout_problem_{k:0{width}d}.pddl"))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+from math import inf as infinity
+
+# Every heuristic is built once per board by its factory and then maps an int state to an estimate
+# of the presses left. The deficit of a state is the set of goal cells that are still off.
+
+def make_count(board):
+    # Off goal cells, not admissible since one press can switch on several cells
+    goal = board.goal
+    def h(state):
+        return (goal & ~state).bit_count()
+    return h
+
+def make_toggle(board):
+    # Off goal cells over the largest number of cells a press toggles, admissible
+    goal = board.goal
+    toggle_size = max(mask.bit_count() for mask in board.masks)
+    def h(state):
+        return -(-(goal & ~state).bit_count() // toggle_size)
+    return h
+
+def make_hmax(board):
+    # press_cell has no dynamic preconditions, so in the delete relaxation every off goal cell
+    # some press touches costs exactly 1 and the others can never be reached
+    goal = board.goal
+    reachable = get_touched_cells(board)
+    def h(state):
+        deficit = goal & ~state
+        if deficit & ~reachable:
+            return infinity
+        return 1 if deficit else 0
+    return h
+
+def make_hadd(board):
+    goal = board.goal
+    reachable = get_touched_cells(board)
+    def h(state):
+        deficit = goal & ~state
+        if deficit & ~reachable:
+            return infinity
+        return deficit.bit_count()
+    return h
+
+def make_chase(board):
+    """
+    Light chasing: repeatedly switch the lowest off cell with the press that toggles it and
+    nothing below it (on a row-major grid, the cell right under it), and estimate what is left
+    once no such press exists with the toggle bound. Informative but not admissible.
+    """
+    goal = board.goal
+    masks = board.masks
+    toggle_size = max(mask.bit_count() for mask in masks)
+    chasers = {}
+    for j, mask in enumerate(masks):
+        low = (mask & -mask).bit_length() - 1
+        chasers[low] = max(chasers.get(low, j), j)
+    def h(state):
+        deficit = goal & ~state
+        presses = 0
+        while deficit:
+            low = (deficit & -deficit).bit_length() - 1
+            if low not in chasers:
+                break
+            deficit = (deficit ^ masks[chasers[low]]) & goal
+            presses += 1
+        return presses - (-deficit.bit_count() // toggle_size)
+    return h
+
+def make_pdb(board, region_size=12):
+    """
+    Pattern database over disjoint regions of at most region_size cells. Each table holds the
+    exact number of presses needed to switch on a region pattern, ignoring the rest of the board,
+    and the maximum over regions is admissible. Tables are cached on disk per board geometry.
+    """
+    from pattern_database import load_pattern_database, UNREACHABLE
+    goal = board.goal
+    regions = load_pattern_database(board, region_size)
+    def h(state):
+        deficit = goal & ~state
+        res = 0
+        for low, region_mask, table in regions:
+            cost = table[deficit >> low & region_mask]
+            if cost == UNREACHABLE:
+                return infinity
+            res = max(res, cost)
+        return res
+    return h
+
+def make_exact(board):
+    """
+    Exact distance to the goal, read from the table of every state of the board: a perfect
+    heuristic, for boards of at most distance_table.MAX_CELLS cells.
+    """
+    from distance_table import load_distance_table
+    return load_distance_table(board).get_distance
+
+def get_touched_cells(board):
+    res = 0
+    for mask in board.masks:
+        res |= mask
+    return res
+
+HEURISTICS = {
+    "count": make_count,
+    "toggle": make_toggle,
+    "hmax": make_hmax,
+    "hadd": make_hadd,
+    "chase": make_chase,
+    "pdb": make_pdb,
+    "exact": make_exact,
+}
+
+def get_heuristic(name, board):
+    if name not in HEURISTICS:
+        raise ValueError(f"Unknown heuristic {name} (expected one of {', '.join(HEURISTICS)})")
+    return HEURISTICS[name](board)
@@ -0,0 +1,80 @@
+import json
+from time import perf_counter
+from contextlib import contextmanager
+
+COUNTERS = (
+    "expansions",   # states expanded by A*, nodes added to the MCTS tree
+    "generated",    # successors pushed on the open list
+    "reopened",     # closed states reached again more cheaply and put back on the open list
+    "duplicates",   # successors already reached at least as cheaply
+    "heap_size",    # peak size of the open list, stale entries included
+    "rollouts",     # MCTS simulations
+    "tree_depth",   # deepest MCTS tree node
+)
+
+class SearchStats:
+    """
+    Counters and per-phase timers shared by every solver. Solvers take an optional SearchStats and
+    only touch it outside their inner loops: counters are kept in locals and added at the end, so a
+    search without stats pays nothing and one with stats pays a few additions per run.
+
+    Args:
+        sample_every (int): If given with callback, call callback(stats, sample) every sample_every
+            expansions (A*) or iterations (MCTS) with a dict of the current search values.
+        callback (callable): Sampling callback.
+    """
+
+    def __init__(self, sample_every=None, callback=None):
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.phases = {}
+        self.sample_every = sample_every if callback is not None else None
+        self.callback = callback
+        self.stack = []
+
+    def add(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def maximum(self, name, value):
+        self.counters[name] = max(self.counters.get(name, 0), value)
+
+    def sample(self, values):
+        self.callback(self, values)
+
+    @contextmanager
+    def phase(self, name):
+        # Nested phases are timed under their full path, e.g. "solve;search"
+        self.stack.append(name)
+        path = ";".join(self.stack)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[path] = self.phases.get(path, 0.0) + perf_counter() - start
+            self.stack.pop()
+
+    def to_dict(self):
+        return {"counters": dict(self.counters), "phases": dict(self.phases)}
+
+    def to_json(self):
+        return json.dumps(self.to_dict())
+
+    def to_folded(self):
+        """
+        Phase times in the folded stack format of flamegraph.pl and speedscope, in microseconds of
+        self time (a phase's time minus that of the phases nested in it).
+        """
+        own = dict(self.phases)
+        for path, seconds in self.phases.items():
+            parent = path.rpartition(";")[0]
+            if parent in own:
+                own[parent] -= seconds
+        return "".join(f"{path} {max(0, round(seconds * 1e6))}\n" for path, seconds in own.items())
+
+@contextmanager
+def phase(stats, name):
+    # Lets callers time a phase whether or not they were given stats
+    if stats is None:
+        yield
+    else:
+        with stats.phase(name):
+            yield
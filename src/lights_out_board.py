@@ -1,61 +1,76 @@
 import random
-from unified_planning.model import Fluent, Object, InstantaneousAction
-from unified_planning.shortcuts import BoolType, Problem, Not, UserType, And
-from unified_planning.io import PDDLWriter
 
-random.seed(33)  # For reproducibility
+def build_problem(rows=5, cols=5, seed=33):
+    """
+    Build the unified-planning problem of a random board. unified-planning is only imported here,
+    so importing this module stays cheap; generator.py builds boards without it altogether.
 
-Cell = UserType("Cell")
-Board = dict((f"c{i}-{j}", Object(f"c{i}-{j}", Cell)) for i in range(5) for j in range(5))  # 5x5 grid of cells
+    Args:
+        rows (int): Number of rows.
+        cols (int): Number of columns.
+        seed (int): Seed of the random initial state, for reproducibility.
 
-#------------------------- Predicates -------------------------#
+    Returns:
+        Problem: The unified-planning problem.
+    """
+    from unified_planning.model import Fluent, Object, InstantaneousAction
+    from unified_planning.shortcuts import BoolType, Problem, Not, UserType
 
-cell_on = Fluent("cell_on", BoolType(), c=Cell)
-cell_off = Fluent("cell_off", BoolType(), c=Cell)
-cell_adjacent = Fluent("cell_adjacent", BoolType(), c1=Cell, c2=Cell)
+    rng = random.Random(seed)
 
-#------------------------ Problem -------------------------#
+    Cell = UserType("Cell")
+    Board = dict((f"c{i}-{j}", Object(f"c{i}-{j}", Cell)) for i in range(rows) for j in range(cols))
 
-problem = Problem("LightsOutBoard")
-problem.add_fluent(cell_on)
-problem.add_fluent(cell_adjacent)
+    #------------------------- Predicates -------------------------#
 
-for cell in Board.values():
-    problem.add_object(cell)
-    problem.set_initial_value(cell_on(cell), random.choice([True, False]))
+    cell_on = Fluent("cell_on", BoolType(), c=Cell)
+    cell_adjacent = Fluent("cell_adjacent", BoolType(), c1=Cell, c2=Cell)
 
-for i in range(5):
-    for j in range(5):
-        if i > 0:
-            problem.set_initial_value(cell_adjacent(Board[f"c{i-1}-{j}"], Board[f"c{i}-{j}"]), True)
-        if j > 0:
-            problem.set_initial_value(cell_adjacent(Board[f"c{i}-{j-1}"], Board[f"c{i}-{j}"]), True)
+    #------------------------ Problem -------------------------#
 
-#------------------------ Actions -------------------------#
+    problem = Problem("LightsOutBoard")
+    problem.add_fluent(cell_on)
+    problem.add_fluent(cell_adjacent)
 
-press_cell = InstantaneousAction("press_cell", c=Cell)
-c = press_cell.parameter("c")
-press_cell.add_precondition(cell_adjacent(Board["c0-0"], Board["c0-1"])) # Always true, just to ensure the action has a precondition
-press_cell.add_effect(fluent=cell_on(c), value=Not(cell_on(c)))
+    for cell in Board.values():
+        problem.add_object(cell)
+        problem.set_initial_value(cell_on(cell), rng.choice([True, False]))
 
-for cell in Board.values():
-    press_cell.add_effect(condition=cell_adjacent(c, cell), fluent=cell_on(cell), value=Not(cell_on(cell)))
+    for i in range(rows):
+        for j in range(cols):
+            if i > 0:
+                problem.set_initial_value(cell_adjacent(Board[f"c{i-1}-{j}"], Board[f"c{i}-{j}"]), True)
+            if j > 0:
+                problem.set_initial_value(cell_adjacent(Board[f"c{i}-{j-1}"], Board[f"c{i}-{j}"]), True)
 
-problem.add_action(press_cell)
+    #------------------------ Actions -------------------------#
 
-#------------------------ Goal -------------------------#
+    press_cell = InstantaneousAction("press_cell", c=Cell)
+    c = press_cell.parameter("c")
+    press_cell.add_precondition(cell_adjacent(Board["c0-0"], Board["c0-1"])) # Always true, just to ensure the action has a precondition
+    press_cell.add_effect(fluent=cell_on(c), value=Not(cell_on(c)))
 
-goal = []
-for cell in Board.values():
-    problem.add_goal(cell_on(cell))
+    for cell in Board.values():
+        press_cell.add_effect(condition=cell_adjacent(c, cell), fluent=cell_on(cell), value=Not(cell_on(cell)))
+
+    problem.add_action(press_cell)
+
+    #------------------------ Goal -------------------------#
+
+    for cell in Board.values():
+        problem.add_goal(cell_on(cell))
+
+    return problem
 
 #------------------------ Generate PDDL files ------------------------#
 
 if __name__ == "__main__":
+    from unified_planning.io import PDDLWriter
 
+    problem = build_problem()
     print(problem)
     writer = PDDLWriter(problem, rewrite_bool_assignments=True)
     writer.write_domain("src/pddl/lightsout_domain.pddl")
     writer.write_problem("src/pddl/lightsout_problem.pddl")
 
-#pyperplan -H hmax -s astar src/pddl/lightsout_domain.pddl src/pddl/lightsout_problem.pddl
\ No newline at end of file
+#pyperplan -H hmax -s astar src/pddl/lightsout_domain.pddl src/pddl/lightsout_problem.pddl
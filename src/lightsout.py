@@ -0,0 +1,197 @@
+from time import perf_counter
+START = perf_counter()
+
+import sys
+import argparse
+
+# Only the standard library is imported up front, every subcommand imports the solver modules it
+# needs when it runs, so that `lightsout generate` never pays for the search code and nothing ever
+# pays for unified-planning.
+
+SOLVERS = ("astar", "gf2", "mcts", "parallel", "ida", "bounded", "bidirectional", "anytime", "lookup")
+
+def get_heuristic_name(options):
+    # IDA* and bounded A* promise optimal plans, which takes an admissible heuristic
+    if options.heuristic is not None:
+        return options.heuristic
+    return "toggle" if options.solver in ("ida", "bounded") else "chase"
+
+def solve(options):
+    import_start = perf_counter()
+    from bitboard import load_board
+    if options.solver == "astar":
+        from board_solver import astar_search, compact_astar_search
+    elif options.solver == "gf2":
+        from board_solver import get_plan
+        from bitboard import get_set_bits
+        from board_solver_gf2 import get_press_set
+    elif options.solver == "mcts":
+        from board_solver_mcts import MCTS
+    elif options.solver == "parallel":
+        from board_solver_parallel import root_parallel_mcts, leaf_parallel_mcts
+    elif options.solver == "bidirectional":
+        from board_solver_bidirectional import bidirectional_search
+    elif options.solver == "anytime":
+        from board_solver_anytime import anytime_search
+    elif options.solver == "lookup":
+        from board_solver import lookup_plan
+    else:
+        from board_solver_bounded import ida_star_search, bounded_astar_search
+    stats = None
+    if options.stats:
+        from instrumentation import SearchStats
+        stats = SearchStats()
+    report_timing(options, "import", perf_counter() - import_start)
+
+    board = load_board(options.domain, options.problem, stats=stats)
+    heuristic = get_heuristic_name(options)
+    search_start = perf_counter()
+    if options.solver == "astar":
+        if options.compact:
+            plan = compact_astar_search(board, heuristic, stats)
+        else:
+            plan = astar_search(board, heuristic, stats, symmetry=options.symmetry, successors=options.successors)
+    elif options.solver == "gf2":
+        presses = get_press_set(board)
+        plan = [] if presses is None else get_plan(board, board.init, get_set_bits(presses))
+    elif options.solver == "mcts":
+        search = MCTS(board, seed=options.seed, stats=stats, symmetry=options.symmetry, successors=options.successors,
+                      rollout_batch=options.rollout_batch)
+        plan = search.run(iterations=options.iterations)
+    elif options.solver == "parallel":
+        if options.parallel_mode == "leaf":
+            plan = leaf_parallel_mcts(board, options.workers, options.iterations, seed=options.seed)
+        else:
+            plan, _ = root_parallel_mcts(board, options.workers, options.iterations, seed=options.seed)
+    elif options.solver == "ida":
+        plan = ida_star_search(board, heuristic, options.memory * 2**20, options.replacement, stats)
+    elif options.solver == "bidirectional":
+        plan = bidirectional_search(board, stats)
+    elif options.solver == "anytime":
+        deadline = None if options.time_limit is None else search_start + options.time_limit
+        def on_improvement(plan, weight):
+            report_timing(options, f"plan of {len(plan) - 1} presses at weight {weight}", perf_counter() - search_start)
+        plan = anytime_search(board, heuristic, deadline=deadline, on_improvement=on_improvement, stats=stats)
+    elif options.solver == "lookup":
+        plan = lookup_plan(board, stats)
+    else:
+        plan = bounded_astar_search(board, heuristic, options.memory * 2**20, stats)
+    report_timing(options, "search", perf_counter() - search_start)
+    if stats is not None:
+        print(stats.to_json() if options.stats == "json" else stats.to_folded(), end="\n" if options.stats == "json" else "", file=sys.stderr)
+
+    actions = [action for _, action in plan[:-1]]
+    if options.json:
+        import json
+        print(json.dumps({"solved": bool(plan), "cost": len(actions) if plan else None, "plan": actions}))
+    elif plan:
+        print("\n".join(actions))
+    else:
+        print("No solution found", file=sys.stderr)
+        return 1
+    return 0
+
+def generate(options):
+    import_start = perf_counter()
+    import generator
+    report_timing(options, "import", perf_counter() - import_start)
+    return generator.main(options.args)
+
+def batch(options):
+    import_start = perf_counter()
+    import batch
+    report_timing(options, "import", perf_counter() - import_start)
+    return batch.main(options.args)
+
+def bench(options):
+    import_start = perf_counter()
+    import benchmark
+    report_timing(options, "import", perf_counter() - import_start)
+    return benchmark.main(options.args)
+
+def boardset(options):
+    import_start = perf_counter()
+    import boardset
+    report_timing(options, "import", perf_counter() - import_start)
+    return boardset.main(options.args)
+
+def precompute(options):
+    import_start = perf_counter()
+    import distance_table
+    report_timing(options, "import", perf_counter() - import_start)
+    return distance_table.main(options.args)
+
+def serve(options):
+    import_start = perf_counter()
+    import daemon
+    report_timing(options, "import", perf_counter() - import_start)
+    return daemon.main(options.args)
+
+def report_timing(options, phase, seconds):
+    if options.timing:
+        print(f"[timing] {phase}: {seconds * 1000:.2f}ms", file=sys.stderr)
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog="lightsout", description="Solve, generate, batch solve and benchmark Lights Out boards.")
+    parser.add_argument("--timing", action="store_true", help="report startup, import and search times on stderr")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    solve_parser = subparsers.add_parser("solve", help="solve a PDDL domain and problem")
+    solve_parser.add_argument("domain", help="PDDL domain file")
+    solve_parser.add_argument("problem", help="PDDL problem file")
+    solve_parser.add_argument("--solver", choices=SOLVERS, default="gf2")
+    solve_parser.add_argument("--heuristic", default=None, help="A* heuristic, chase by default; IDA* and bounded A* default to toggle, they are only optimal with an admissible one")
+    solve_parser.add_argument("--compact", action="store_true", help="store A* states in packed arrays, slower but far smaller")
+    solve_parser.add_argument("--symmetry", action="store_true", help="search A* and MCTS states up to the board symmetries")
+    solve_parser.add_argument("--successors", choices=("all", "ordered"), default="all", help="A* and MCTS successors: every press, or only presses after the last one")
+    solve_parser.add_argument("--time-limit", type=float, default=None, help="anytime search budget in seconds, the best plan found by then is printed")
+    solve_parser.add_argument("--memory", type=int, default=256, help="memory budget of IDA* and bounded A* in MiB")
+    solve_parser.add_argument("--replacement", choices=("depth", "lru"), default="depth", help="IDA* transposition table eviction")
+    solve_parser.add_argument("--iterations", type=int, default=1000, help="MCTS iterations, per worker in root-parallel MCTS")
+    solve_parser.add_argument("--rollout-batch", type=int, default=None, help="MCTS rollouts per iteration, played at once with NumPy")
+    solve_parser.add_argument("--workers", type=int, default=2, help="parallel MCTS worker processes")
+    solve_parser.add_argument("--parallel-mode", choices=("root", "leaf"), default="root",
+                              help="parallel MCTS: one tree per worker sharing root statistics, or one tree with rollouts batched over the workers")
+    solve_parser.add_argument("--seed", type=int, default=0)
+    solve_parser.add_argument("--json", action="store_true", help="print the result as a JSON object")
+    solve_parser.add_argument("--stats", choices=("json", "folded"), help="print the search counters and phase times on stderr, as JSON or folded stacks")
+    solve_parser.set_defaults(run=solve)
+
+    generate_parser = subparsers.add_parser("generate", help="generate boards, see generator.py --help", add_help=False)
+    generate_parser.set_defaults(run=generate)
+
+    batch_parser = subparsers.add_parser("batch", help="solve JSON lines of boards, see batch.py --help", add_help=False)
+    batch_parser.set_defaults(run=batch)
+
+    bench_parser = subparsers.add_parser("bench", help="benchmark the solvers, see benchmark.py --help", add_help=False)
+    bench_parser.set_defaults(run=bench)
+
+    boardset_parser = subparsers.add_parser("boardset", help="convert between PDDL and binary board sets, see boardset.py --help", add_help=False)
+    boardset_parser.set_defaults(run=boardset)
+
+    precompute_parser = subparsers.add_parser("precompute", help="build the optimal distance table of a small board, see distance_table.py --help", add_help=False)
+    precompute_parser.set_defaults(run=precompute)
+
+    serve_parser = subparsers.add_parser("serve", help="run the solver daemon, see daemon.py --help", add_help=False)
+    serve_parser.set_defaults(run=serve)
+    return parser
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = get_parser()
+    # generate, batch, bench, boardset, precompute and serve hand everything after their name to their own parser
+    for i, arg in enumerate(argv):
+        if not arg.startswith("-"):
+            break
+    else:
+        i = len(argv)
+    if i < len(argv) and argv[i] in ("generate", "batch", "bench", "boardset", "precompute", "serve"):
+        options = parser.parse_args(argv[:i + 1])
+        options.args = argv[i + 1:]
+    else:
+        options = parser.parse_args(argv)
+    report_timing(options, "startup", perf_counter() - START)
+    return options.run(options)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import re
 from collections import namedtuple
 
 Constant = namedtuple("Constant", ["name", "type"])
@@ -8,167 +9,154 @@ Effect = namedtuple("Effect", ["conditions", "effects"])
 Domain = namedtuple("Domain", ["types", "constants", "predicates", "actions"])
 Problem = namedtuple("Problem", ["init", "goal"])
 
+#--------------------------------------------------------------------------------------------------------------#
+#--------------------------------------------- S-EXPRESSIONS --------------------------------------------------#
+#--------------------------------------------------------------------------------------------------------------#
+
+TOKEN = re.compile(r"[()]|[^\s()]+")
+
+def read_sexpression(file_path):
+    """
+    Read a PDDL file into nested lists of tokens in a single pass, whatever its line breaks.
+
+    Args:
+        file_path (str): Path to the PDDL file.
+
+    Returns:
+        list: The top-level s-expression, e.g. ["define", ["domain", "name"], ...].
+    """
+    stack = [[]]
+    with open(file_path) as file:
+        for line in file:
+            # Tokens never span lines, so the file is streamed instead of read as a whole
+            for token in TOKEN.findall(line.split(";", 1)[0]):
+                if token == "(":
+                    stack.append([])
+                elif token == ")":
+                    if len(stack) == 1:
+                        raise ValueError(f"Unbalanced ')' in {file_path}")
+                    expression = stack.pop()
+                    stack[-1].append(expression)
+                else:
+                    stack[-1].append(token)
+    if len(stack) != 1 or len(stack[0]) != 1:
+        raise ValueError(f"Expected a single balanced s-expression in {file_path}")
+    return stack[0][0]
+
+def get_sections(expression, kind):
+    if not expression or expression[0] != "define":
+        raise ValueError(f"Expected (define ...), found {expression[:2]}")
+    if not isinstance(expression[1], list) or expression[1][0] != kind:
+        raise ValueError(f"Expected a {kind} definition, found {expression[1]}")
+    return expression[2:]
+
+def parse_typed_list(tokens):
+    # "a b - t c" gives [(a, t), (b, t), (c, object)]
+    res = []
+    pending = []
+    i = 0
+    while i < len(tokens):
+        if tokens[i] == "-":
+            if i + 1 >= len(tokens):
+                raise ValueError(f"Missing type after '-' in {tokens}")
+            res.extend((name, tokens[i + 1]) for name in pending)
+            pending = []
+            i += 2
+        else:
+            pending.append(tokens[i])
+            i += 1
+    res.extend((name, "object") for name in pending)
+    return res
+
+def parse_literal(expression):
+    positive = True
+    if expression[0] == "not":
+        positive = False
+        expression = expression[1]
+    name = expression[0]
+    parameters = [parameter.lstrip("?") for parameter in expression[1:]]
+    if len(parameters) == 1:
+        return UnaryPredicate(name, parameters[0], positive)
+    elif len(parameters) == 2:
+        return BinaryPredicate(name, parameters[0], parameters[1], positive)
+    raise ValueError(f"Only unary and binary predicates are supported, found {expression}")
+
+def parse_conjunction(expression):
+    if not expression:
+        return []
+    if expression[0] == "and":
+        res = []
+        for part in expression[1:]:
+            res.extend(parse_conjunction(part))
+        return res
+    return [parse_literal(expression)]
+
 #--------------------------------------------------------------------------------------------------------------#
 #--------------------------------------------- DOMAIN PARSING -------------------------------------------------#
 #--------------------------------------------------------------------------------------------------------------#
 
 def parse_domain(file_path):
-    with open(file_path) as file:
-        lines = file.readlines()
-    in_types = False
-    in_constants = False
-    in_predicates = False
-    in_action = False
     types = []
     constants = []
     predicates = []
     actions = []
-    action_name = None
-    action_params = []
-    action_preconditions = []
-    action_effects = []
-    for line in lines:
-        line = line.strip()
-        if line != "":
-            if line.startswith("(:types"):
-                if line.strip() == "(:types)":
-                    in_types = True
-                else:
-                    for domain_type in line.replace("(:types", "").replace(")", "").split(" ")[1:]:
-                        types.append(domain_type.strip())
-            elif in_types:
-                # Do if necessary, I think unified-planning does not behave like this
-                pass
-            elif line.startswith("(:constants"):
-                in_types = False
-                if line.strip() == "(:constants":
-                    in_constants = True
-                else:
-                    # Do if necessary, I think unified-planning does not behave like this
-                    pass
-            elif in_constants:
-                if line.strip() != ")":
-                    objs = line.split(" - ")
-                    constant_type = objs[1].strip()
-                    if constant_type not in types:
-                        raise ValueError(f"Type {constant_type} not in domain ({types})")
-                    for constant in objs[0].split(" "):
-                        constants.append(Constant(constant.strip(), constant_type))
+    for section in get_sections(read_sexpression(file_path), "domain"):
+        keyword = section[0]
+        if keyword == ":types":
+            for name, _ in parse_typed_list(section[1:]):
+                types.append(name)
+        elif keyword == ":constants":
+            for name, constant_type in parse_typed_list(section[1:]):
+                constants.append(parse_constant(name, constant_type, types))
+        elif keyword == ":predicates":
+            for predicate in section[1:]:
+                parameters = [parse_constant(name, param_type, types) for name, param_type in parse_typed_list(predicate[1:])]
+                if len(parameters) == 1:
+                    predicates.append(UnaryPredicate(predicate[0], parameters[0], True))
+                elif len(parameters) == 2:
+                    predicates.append(BinaryPredicate(predicate[0], parameters[0], parameters[1], True))
                 else:
-                    in_constants = False
-            elif line.startswith("(:predicates"):
-                if line.strip() == "(:predicates":
-                    in_predicates = True
-                else:
-                    objs = line.replace("(:predicates", "").replace("))", "").split(") (")
-                    for predicate in objs:
-                        predicate = predicate.replace("(", "").replace(")", "").replace(" - ", "-").strip()
-                        if len(predicate.split(" ")) == 2:
-                            name, param = predicate.split(" ?")
-                            parsed_param = parse_constant(param, types)
-                            predicates.append(UnaryPredicate(name.strip(), parsed_param, True))
-                        elif len(predicate.split(" ")) == 3:
-                            name, param1, param2 = predicate.split(" ?")
-                            parsed_param1 = parse_constant(param1, types)
-                            parsed_param2 = parse_constant(param2, types)
-                            predicates.append(BinaryPredicate(name.strip(), parsed_param1, parsed_param2, True))
-            elif in_predicates:
-                # Do if necessary, I think unified-planning does not behave like this
-                pass
-            elif line.startswith("(:action"):
-                in_action = True
-                action_name = line.replace("(:action", "").strip()
-                action_params = []
-                action_preconditions = []
-                action_effects = []
-            elif in_action:
-                if line.startswith(":parameters"):
-                    params = line.replace(":parameters (", "").strip()[1:].split(" ?")
-                    for param in params:
-                        parsed_param = parse_constant(param, types)
-                        action_params.append(parsed_param)
-                elif line.startswith(":precondition"):
-                    preconditions = line.replace(":precondition ()", "").replace("and (","").replace("))", "").strip()
-                    objs = preconditions.split(") (")
-                    for precondition in objs:
-                        if len(precondition.split(" ")) == 2:
-                            name, param = precondition.split(" ?")
-                            action_preconditions.append(UnaryPredicate(name.strip(), param.strip(), True))
-                        elif len(precondition.split(" ")) == 3:
-                            name, param1, param2 = precondition.split(" ?")
-                            action_preconditions.append(BinaryPredicate(name.strip(), param1.strip(), param2.strip(), True))
-                elif line.startswith(":effect"):
-                    effects = line.replace(":effect (and (","").strip()
-                    objs = effects.split("(when (")
-                    for effect in objs:
-                        effect = effect.replace("when", "").strip()
-                        if effect.strip() != "":
-                            conditions = []
-                            effects = []
-                            if effect.strip().startswith("and ("):
-                                effect = effect.replace("and (","").strip()
-                            effect_parts = effect.strip().split(") (")
-                            for i in range(len(effect_parts)):
-                                part = effect_parts[i].replace("(","").replace(")","").replace("?","").strip()
-                                positive = True
-                                if part.startswith("not"):
-                                    positive = False
-                                    part = part.replace("not","").strip()
-                                if i < len(effect_parts) - 1:
-                                    condition_parts = part.split(" ")
-                                    if len(condition_parts) == 2:
-                                        conditions.append(UnaryPredicate(condition_parts[0], condition_parts[1], positive))
-                                    elif len(condition_parts) == 3:
-                                        conditions.append(BinaryPredicate(part.split(" ")[0], part.split(" ")[1], part.split(" ")[2], positive))
-                                else:
-                                    effects.append(UnaryPredicate(part.split(" ")[0], part.split(" ")[1], positive))
-                            action_effects.append(Effect(conditions, effects))
-                elif line == ")":
-                    actions.append(Action(action_name, action_params, action_preconditions, action_effects))
-                    in_action = False
-
+                    raise ValueError(f"Only unary and binary predicates are supported, found {predicate}")
+        elif keyword == ":action":
+            actions.append(parse_action(section, types))
     return Domain(types, constants, predicates, actions)
 
-def parse_constant(constant, types):
-    parts = constant.replace("(","").replace(")","").split("-")
-    if parts[1].strip() not in types:
-        raise ValueError(f"Type {parts[1].strip()} not in domain ({types})")
-    param = Constant(parts[0].strip(), parts[1].strip())
-    return param
+def parse_action(section, types):
+    action_name = section[1]
+    action_params = []
+    action_effects = []
+    fields = dict(zip(section[2::2], section[3::2]))
+    for name, param_type in parse_typed_list(fields.get(":parameters", [])):
+        action_params.append(parse_constant(name, param_type, types))
+    action_preconditions = parse_conjunction(fields.get(":precondition", []))
+    effects = fields.get(":effect", [])
+    if effects and effects[0] != "and":
+        effects = ["and", effects]
+    for effect in effects[1:]:
+        if effect[0] == "when":
+            action_effects.append(Effect(parse_conjunction(effect[1]), parse_conjunction(effect[2])))
+        else:
+            action_effects.append(Effect([], [parse_literal(effect)]))
+    return Action(action_name, action_params, action_preconditions, action_effects)
+
+def parse_constant(name, constant_type, types):
+    if constant_type not in types:
+        raise ValueError(f"Type {constant_type} not in domain ({types})")
+    return Constant(name.lstrip("?"), constant_type)
 
 #----------------------------------------------------------------------------------------------------------------#
 #------------------------------------------------- PROBLEM PARSING ----------------------------------------------#
 #----------------------------------------------------------------------------------------------------------------#
 
 def parse_problem(file_path):
-    with open(file_path) as file:
-        lines = file.readlines()
-
     init_conditions = []
     goal_conditions = []
-
-    for line in lines:
-        line = line.strip()
-        if line != "":
-            if line.startswith("(:init"):
-                facts = line.replace("(:init", "").replace(")", "").strip().split("(")
-                for fact in facts:
-                    obj = fact.strip().split()
-                    if len(obj) == 2:
-                        init_conditions.append(UnaryPredicate(obj[0], obj[1], True))
-                    elif len(obj) == 3:
-                        init_conditions.append(BinaryPredicate(obj[0], obj[1], obj[2], True))
-
-            elif line.startswith("(:goal"):
-                line = line.replace("(:goal (and", "").replace(")", "").strip()
-                conditions = line.split("(")
-                for cond in conditions:
-                    obj = cond.split()
-                    if len(obj) == 2:
-                        goal_conditions.append(UnaryPredicate(obj[0], obj[1], True))
-                    elif len(obj) == 3:
-                        goal_conditions.append(BinaryPredicate(obj[0], obj[1], obj[2], True))
-
+    for section in get_sections(read_sexpression(file_path), "problem"):
+        if section[0] == ":init":
+            for fact in section[1:]:
+                init_conditions.append(parse_literal(fact))
+        elif section[0] == ":goal":
+            goal_conditions = parse_conjunction(section[1])
     return Problem(init_conditions, goal_conditions)
 
 
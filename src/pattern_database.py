@@ -0,0 +1,79 @@
+import os
+import mmap
+import struct
+from cache import get_cache_path, get_geometry_key, write_atomic
+
+UNREACHABLE = 255
+MAGIC = b"LOPDB1"
+# Magic, region size, number of regions
+HEADER = struct.Struct("<6sHH")
+
+def load_pattern_database(board, region_size=12, use_cache=True):
+    """
+    Get the pattern database of a board, building and saving it the first time its geometry is seen.
+
+    Args:
+        board (Board): Compiled board.
+        region_size (int): Maximum number of cells per region, each table takes 2**region_size bytes.
+        use_cache (bool): Whether to load and save the tables from the on-disk cache.
+
+    Returns:
+        list: (low, region_mask, table) for every region, where table[pattern] is the exact number of
+        presses needed to switch on the off cells of the region given as a pattern of its bits.
+    """
+    regions = get_regions(len(board.cells), region_size)
+    if not use_cache:
+        return [(low, (1 << size) - 1, get_region_table(board, low, size)) for low, size in regions]
+    path = get_cache_path("pdb", get_geometry_key(board, region_size), "pdb")
+    if not os.path.exists(path):
+        tables = [get_region_table(board, low, size) for low, size in regions]
+        write_atomic(path, [HEADER.pack(MAGIC, region_size, len(regions))] + tables)
+    return map_pattern_database(path, regions)
+
+def map_pattern_database(path, regions):
+    with open(path, "rb") as file:
+        # The mapping outlives the file object, and read-only pages are shared between processes
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, _, count = HEADER.unpack_from(data)
+    if magic != MAGIC or count != len(regions):
+        raise ValueError(f"{path} is not a pattern database for this board")
+    view = memoryview(data)
+    res = []
+    offset = HEADER.size
+    for low, size in regions:
+        res.append((low, (1 << size) - 1, view[offset:offset + (1 << size)]))
+        offset += 1 << size
+    return res
+
+def get_regions(n, region_size):
+    # Disjoint runs of consecutive cells (whole rows on a row-major board), as even as possible
+    count = -(-n // region_size)
+    res = []
+    low = 0
+    for i in range(count):
+        size = n // count + (1 if i < n % count else 0)
+        res.append((low, size))
+        low += size
+    return res
+
+def get_region_table(board, low, size):
+    # Backward breadth first search from the cleared pattern over the presses projected on the region
+    region_mask = (1 << size) - 1
+    goal = board.goal >> low & region_mask
+    projected = {mask >> low & region_mask for mask in board.masks} - {0}
+    table = bytearray([UNREACHABLE]) * (1 << size)
+    table[0] = 0
+    frontier = [0]
+    cost = 0
+    while frontier:
+        cost += 1
+        next_frontier = []
+        for pattern in frontier:
+            for mask in projected:
+                # Cells outside the goal never need switching, so they are not part of the pattern
+                next_pattern = (pattern ^ mask) & goal
+                if table[next_pattern] == UNREACHABLE:
+                    table[next_pattern] = min(cost, UNREACHABLE - 1)
+                    next_frontier.append(next_pattern)
+        frontier = next_frontier
+    return table
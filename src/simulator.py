@@ -0,0 +1,119 @@
+import numpy as np
+
+# NumPy is only needed here, the solvers import this module lazily when they are asked for
+# batched rollouts, so the rest of the package runs without it.
+
+WORD = 64
+
+if hasattr(np, "bitwise_count"):
+    def popcount(words):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+else:
+    # NumPy before 2.0, count the bits a byte at a time
+    BYTE_COUNTS = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+    def popcount(words):
+        return BYTE_COUNTS[np.ascontiguousarray(words).view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+class BatchSimulator:
+    """
+    Many states of one board at once: a batch is a (count, words) uint64 array, state k packed
+    little-endian into row k. Presses, deficits and goal checks then run on whole batches.
+
+    Args:
+        board (Board): Compiled board.
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.n = len(board.cells)
+        self.words = max(1, -(-self.n // WORD))
+        self.masks = self.pack(board.masks)
+        self.goal = self.pack([board.goal])[0]
+        self.goal_count = max(board.goal.bit_count(), 1)
+
+    def pack(self, states):
+        res = np.empty((len(states), self.words), dtype=np.uint64)
+        word_mask = (1 << WORD) - 1
+        for k, state in enumerate(states):
+            for w in range(self.words):
+                res[k, w] = state >> (WORD * w) & word_mask
+        return res
+
+    def unpack(self, batch):
+        return [sum(int(word) << (WORD * w) for w, word in enumerate(row)) for row in batch]
+
+    def press(self, batch, actions):
+        # Press actions[k] on state k, in place
+        batch ^= self.masks[actions]
+        return batch
+
+    def get_deficits(self, batch):
+        # Number of goal cells still off in every state
+        return popcount(self.goal & ~batch)
+
+    def is_goal(self, batch):
+        return ~(self.goal & ~batch).any(axis=-1)
+
+    def rollouts(self, state, depth, last, count, max_depth, rng, policy="random"):
+        """
+        Play count rollouts from the same state at once, with the rewards of MCTS.simulate.
+
+        Args:
+            state (int): State the rollouts start from.
+            depth (int): Presses already made to reach it.
+            last (int): Press that reached it, which no rollout repeats first, or None.
+            count (int): Number of rollouts.
+            max_depth (int): Depth at which rollouts stop.
+            rng (Generator): NumPy random generator.
+            policy (str): "random" presses, or "greedy" ones that leave the fewest goal cells
+                off, ties broken at random.
+
+        Returns:
+            tuple: The reward of every rollout, and the presses of the shortest one that reached
+            the goal or None.
+        """
+        n = self.n
+        batch = np.repeat(self.pack([state]), count, axis=0)
+        steps = max(0, max_depth - depth)
+        presses = np.zeros((count, steps), dtype=np.int32)
+        lengths = np.full(count, -1, dtype=np.int64)
+        best_deficits = self.get_deficits(batch)
+        active = np.ones(count, dtype=bool)
+        if best_deficits[0] == 0:
+            lengths[:] = 0
+            active[:] = False
+        previous = np.full(count, -1 if last is None else last, dtype=np.int64)
+        rows = np.arange(count)
+        for step in range(steps):
+            if not active.any():
+                break
+            if policy == "greedy":
+                # Deficit after every press from every state, (count, n)
+                deficits = popcount(self.goal & ~(batch[:, None, :] ^ self.masks[None, :, :])).astype(np.float64)
+                deficits += rng.random((count, n))
+                deficits[previous >= 0, previous[previous >= 0]] = np.inf
+                actions = deficits.argmin(axis=1)
+            else:
+                # Every press on the first step, then skip the previous press, which would only undo it
+                has_previous = previous >= 0
+                actions = rng.integers(0, n - has_previous)
+                actions += has_previous & (actions >= previous)
+            actions[~active] = 0
+            toggles = self.masks[actions]
+            toggles[~active] = 0
+            batch ^= toggles
+            presses[:, step] = actions
+            previous = np.where(active, actions, previous)
+            deficits = self.get_deficits(batch)
+            np.minimum(best_deficits, np.where(active, deficits, best_deficits), out=best_deficits)
+            solved = active & (deficits == 0)
+            lengths[solved] = step + 1
+            active &= ~solved
+        rewards = 0.5 * (1 - best_deficits / self.goal_count)
+        solved = lengths >= 0
+        rewards[solved] = 0.5 + 0.5 * (1 - (depth + lengths[solved]) / (max_depth + 1))
+        best = None
+        if solved.any():
+            k = rows[solved][lengths[solved].argmin()]
+            best = presses[k, :lengths[k]].tolist()
+        return rewards, best
@@ -0,0 +1,105 @@
+from array import array
+
+# Fibonacci hashing constant, spreads the low bits of int hashes (the first cells of the board)
+# over the whole table
+MULTIPLIER = 0x9E3779B97F4A7C15
+EMPTY = -1
+
+class StateStore:
+    """
+    Search states packed into fixed-width bytes, with their parent index, action and g kept in
+    parallel arrays and looked up through an open-addressing hash table of indices. A state costs
+    its packed bytes plus 8 bytes of arrays and 5 to 11 bytes of table, under 32 bytes on boards of
+    up to 100 cells, where a dict entry with its int key and parent tuple costs well over 200.
+
+    Args:
+        n_cells (int): Number of cells, the packed width of every state.
+        capacity (int): Initial number of table slots, rounded up to a power of two.
+    """
+
+    def __init__(self, n_cells, capacity=1024):
+        self.width = max(1, (n_cells + 7) // 8)
+        self.states = bytearray()
+        self.parents = array("i")
+        self.actions = array("H")
+        self.g = array("H")
+        self.bits = max(4, (capacity - 1).bit_length())
+        self.slots = array("i", [EMPTY]) * (1 << self.bits)
+
+    def __len__(self):
+        return len(self.g)
+
+    def find(self, state):
+        """
+        Returns:
+            int: The index of a state, or -1 if it is not stored.
+        """
+        width = self.width
+        key = state.to_bytes(width, "little")
+        states = self.states
+        slots = self.slots
+        mask = len(slots) - 1
+        slot = (hash(state) * MULTIPLIER >> 64 - self.bits) & mask
+        while True:
+            index = slots[slot]
+            if index == EMPTY:
+                return EMPTY
+            if states[index * width:(index + 1) * width] == key:
+                return index
+            slot = (slot + 1) & mask
+
+    def add(self, state, parent, action, g):
+        """
+        Store a state that find could not, it must not be stored yet.
+
+        Returns:
+            int: The index of the new state.
+        """
+        index = len(self.g)
+        if (index + 1) * 4 > len(self.slots) * 3:
+            self.grow()
+        self.states += state.to_bytes(self.width, "little")
+        self.parents.append(parent)
+        self.actions.append(action)
+        self.g.append(g)
+        self.insert(hash(state), index)
+        return index
+
+    def update(self, index, parent, action, g):
+        self.parents[index] = parent
+        self.actions[index] = action
+        self.g[index] = g
+
+    def get_state(self, index):
+        return int.from_bytes(self.states[index * self.width:(index + 1) * self.width], "little")
+
+    def get_path(self, index):
+        """
+        Returns:
+            list: The actions from the first stored state to the state at index.
+        """
+        path = []
+        while self.parents[index] != EMPTY:
+            path.append(self.actions[index])
+            index = self.parents[index]
+        path.reverse()
+        return path
+
+    def insert(self, state_hash, index):
+        slots = self.slots
+        mask = len(slots) - 1
+        slot = (state_hash * MULTIPLIER >> 64 - self.bits) & mask
+        while slots[slot] != EMPTY:
+            slot = (slot + 1) & mask
+        slots[slot] = index
+
+    def grow(self):
+        # Doubles the table, keeping it at most three quarters full
+        self.bits += 1
+        self.slots = array("i", [EMPTY]) * (1 << self.bits)
+        for index in range(len(self.g)):
+            self.insert(hash(self.get_state(index)), index)
+
+    def nbytes(self):
+        return (len(self.states) + len(self.slots) * self.slots.itemsize + len(self.parents) * self.parents.itemsize
+                + len(self.actions) * self.actions.itemsize + len(self.g) * self.g.itemsize)
@@ -0,0 +1,198 @@
+from time import perf_counter
+from bitboard import get_action_name, get_state_cells, get_set_bits
+
+# A symmetry of a board is a permutation of its cells, given as the list of the image of every
+# cell, that maps the press mask of every cell onto the press mask of its image and the goal onto
+# itself. It maps every state to one that is exactly as far from the goal, so a search only needs
+# one state per orbit. The cell_adjacent facts are all that the masks encode, so these are the
+# automorphisms of the adjacency graph that also preserve the goal: 8 on square grids, 4 on
+# rectangular ones.
+
+def get_symmetries(board, max_size=64, time_limit=5.0):
+    """
+    Find the symmetries of a board by backtracking over cell images in breadth-first order, so that
+    every cell but the first of each component must map next to the image of a mapped neighbour.
+    Only cells of the same colour after colour refinement are tried as images, which on grids,
+    tori and hex boards leaves a single candidate past the first few cells.
+
+    Args:
+        board (Board): Compiled board.
+        max_size (int): Stop after this many symmetries, a subset is still sound, only less useful.
+        time_limit (float): Stop after this many seconds with the symmetries found so far, None
+            for no limit.
+
+    Returns:
+        list: The symmetries as image lists, the identity first.
+    """
+    n = len(board.cells)
+    deadline = None if time_limit is None else perf_counter() + time_limit
+    neighbours = [[j for j in get_set_bits(mask) if j != i] for i, mask in enumerate(board.masks)]
+    adjacent = [set(cells) for cells in neighbours]
+    colours = get_colours(board, neighbours)
+    order, parents = get_search_order(neighbours, colours)
+    symmetries = []
+    image = [None] * n
+    used = [False] * n
+    # Each frame holds the candidate images left for the cell at its depth
+    stack = [iter(get_candidates(order[0], parents, image, used, colours, neighbours))]
+    steps = 0
+    while stack:
+        steps += 1
+        if deadline is not None and steps % 1024 == 0 and perf_counter() > deadline:
+            break
+        depth = len(stack) - 1
+        cell = order[depth]
+        if image[cell] is not None:
+            used[image[cell]] = False
+            image[cell] = None
+        for candidate in stack[-1]:
+            if all((image[other] in adjacent[candidate]) for other in neighbours[cell] if image[other] is not None) \
+                    and sum(image[other] is not None for other in neighbours[cell]) \
+                        == sum(used[other] for other in neighbours[candidate]):
+                image[cell] = candidate
+                used[candidate] = True
+                break
+        else:
+            stack.pop()
+            continue
+        if depth + 1 < n:
+            stack.append(iter(get_candidates(order[depth + 1], parents, image, used, colours, neighbours)))
+        elif is_symmetry(board, image, neighbours, adjacent):
+            symmetries.append(list(image))
+            if len(symmetries) == max_size:
+                break
+    # The identity comes first, so transform 0 is the identity, even when the search stopped early
+    identity = list(range(n))
+    if identity in symmetries:
+        symmetries.remove(identity)
+    elif len(symmetries) == max_size:
+        symmetries.pop()
+    return [identity] + symmetries
+
+def is_symmetry(board, image, neighbours, adjacent):
+    # In O(cells + edges): every toggled neighbour and the goal and self-toggle bits map over
+    goal = board.goal
+    masks = board.masks
+    for i, cell in enumerate(image):
+        if goal >> i & 1 != goal >> cell & 1 or masks[i] >> i & 1 != masks[cell] >> cell & 1:
+            return False
+        if len(neighbours[i]) != len(neighbours[cell]) or any(image[j] not in adjacent[cell] for j in neighbours[i]):
+            return False
+    return True
+
+def get_colours(board, neighbours):
+    # Colour refinement: cells that can map onto each other end up with the same colour
+    n = len(board.cells)
+    colours = [(len(neighbours[i]), board.masks[i] >> i & 1, board.goal >> i & 1) for i in range(n)]
+    classes = 0
+    while True:
+        keys = [(colours[i], tuple(sorted(colours[j] for j in neighbours[i]))) for i in range(n)]
+        labels = {key: label for label, key in enumerate(sorted(set(keys)))}
+        colours = [labels[key] for key in keys]
+        if len(labels) == classes:
+            return colours
+        classes = len(labels)
+
+def get_search_order(neighbours, colours):
+    # Breadth-first order, each component starting from one of its cells of the rarest colour
+    n = len(neighbours)
+    frequency = {}
+    for colour in colours:
+        frequency[colour] = frequency.get(colour, 0) + 1
+    order = []
+    parents = [None] * n
+    seen = [False] * n
+    for start in sorted(range(n), key=lambda i: (frequency[colours[i]], i)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        queue = [start]
+        for cell in queue:
+            for other in neighbours[cell]:
+                if not seen[other]:
+                    seen[other] = True
+                    parents[other] = cell
+                    queue.append(other)
+        order.extend(queue)
+    return order, parents
+
+def get_candidates(cell, parents, image, used, colours, neighbours):
+    parent = parents[cell]
+    pool = range(len(colours)) if parent is None else neighbours[image[parent]]
+    return [other for other in pool if not used[other] and colours[other] == colours[cell]]
+
+def permute(state, permutation):
+    res = 0
+    i = 0
+    while state:
+        if state & 1:
+            res |= 1 << permutation[i]
+        state >>= 1
+        i += 1
+    return res
+
+def make_canonical(board, symmetries):
+    """
+    Build the canonical form of states: the smallest image of a state under the symmetries. Each
+    symmetry is applied a byte at a time through 256-entry tables of the permuted bits.
+
+    Returns:
+        callable: Maps a state to its canonical form and the index of the symmetry giving it.
+    """
+    n = len(board.cells)
+    width = (n + 7) // 8
+    all_tables = []
+    for permutation in symmetries[1:]:
+        tables = []
+        for k in range(width):
+            table = [0] * 256
+            for byte in range(1, 256):
+                low = byte & -byte
+                cell = 8 * k + low.bit_length() - 1
+                table[byte] = table[byte ^ low] | (1 << permutation[cell] if cell < n else 0)
+            tables.append(table)
+        all_tables.append(tables)
+    def canonical(state):
+        data = state.to_bytes(width, "little")
+        best = state
+        best_transform = 0
+        for transform, tables in enumerate(all_tables, 1):
+            image = 0
+            for table, byte in zip(tables, data):
+                image |= table[byte]
+            if image < best:
+                best = image
+                best_transform = transform
+        return best, best_transform
+    return canonical
+
+def get_symmetric_solution_path(board, state, parents, transforms, symmetries, initial_transform):
+    """
+    Rebuild a plan found over canonical states in the orientation of the real board. Along the
+    path, the canonical state is always the real one under a symmetry T, starting with the one
+    that canonicalized the initial state; a canonical press a is then the real press T^-1(a), and
+    the symmetry that canonicalized its successor composes onto T.
+
+    Args:
+        transforms (dict): Index of the symmetry that canonicalized every reached state.
+        initial_transform (int): Index of the symmetry that canonicalized the initial state.
+    """
+    actions = []
+    while parents[state][0] is not None:
+        parent, action = parents[state]
+        actions.append((action, transforms[state]))
+        state = parent
+    actions.reverse()
+    current = symmetries[initial_transform]
+    real = board.init
+    path = []
+    for action, transform in actions:
+        inverse = [0] * len(current)
+        for cell, cell_image in enumerate(current):
+            inverse[cell_image] = cell
+        press = inverse[action]
+        path.append((get_state_cells(board, real), get_action_name(board, press)))
+        real ^= board.masks[press]
+        current = [symmetries[transform][cell_image] for cell_image in current]
+    path.append((get_state_cells(board, real), None))
+    return path
@@ -0,0 +1,146 @@
+from array import array
+from bitboard import Board
+
+# Adjacency of a board in compressed sparse row form over integer cell ids: the neighbours of
+# cell i are indices[indptr[i]:indptr[i + 1]], sorted. Boards of any shape are built from it
+# without grounding a PDDL domain, and get_board turns it into the toggle masks the solvers use.
+#
+# The topology itself takes O(cells + edges) memory, but the solvers do not read it: they take a
+# Board, whose states and toggle masks are ints as wide as the board. A press is an O(cells) XOR
+# and the masks take about cells^2 / 16 bytes, 7 MiB at 10k cells and 104 MiB at 40k, so boards
+# of 100k cells remain out of reach. Only grounding, in compile_board, scales with the edges.
+
+class Topology:
+    """
+    Args:
+        indptr (array): Offset of the neighbours of every cell in indices, plus the total at the end.
+        indices (array): Neighbours of every cell, one run per cell.
+        cells (tuple): Name of every cell, c<i> by default.
+    """
+
+    def __init__(self, indptr, indices, cells=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.cells = tuple(f"c{i}" for i in range(len(indptr) - 1)) if cells is None else tuple(cells)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def neighbours(self, cell):
+        return self.indices[self.indptr[cell]:self.indptr[cell + 1]]
+
+    def get_mask(self, cell):
+        mask = 1 << cell
+        for other in self.neighbours(cell):
+            mask |= 1 << other
+        return mask
+
+def get_board(topology, init=0, goal=None, action="press_cell"):
+    """
+    Compile a board from a topology, where pressing a cell toggles it and its neighbours. The
+    masks take memory quadratic in the cells, see the note at the top of this module.
+
+    Args:
+        topology (Topology): Cells and their adjacency.
+        init (int): Initial state.
+        goal (int): Goal cells, every cell by default.
+        action (str): Name of the press action.
+
+    Returns:
+        Board: The compiled board.
+    """
+    n = len(topology)
+    masks = tuple(topology.get_mask(cell) for cell in range(n))
+    goal = (1 << n) - 1 if goal is None else goal
+    return Board(topology.cells, masks, init, goal, action)
+
+#--------------------------------------------------------------------------------------------------------#
+#------------------------------------------ CONSTRUCTORS ------------------------------------------------#
+#--------------------------------------------------------------------------------------------------------#
+
+def edge_topology(n, edges, cells=None):
+    """
+    Build a topology from an edge list, in two passes over the edges. Self loops and repeated
+    edges are dropped, and edges are undirected.
+
+    Args:
+        n (int): Number of cells.
+        edges (iterable): Pairs of cell ids, read twice unless it is a list or a tuple.
+        cells (tuple): Name of every cell.
+
+    Returns:
+        Topology: The topology.
+    """
+    if not isinstance(edges, (list, tuple)):
+        edges = list(edges)
+    counts = array("l", [0]) * (n + 1)
+    for i, j in edges:
+        if not (0 <= i < n and 0 <= j < n):
+            raise ValueError(f"Edge ({i}, {j}) out of range for {n} cells")
+        if i != j:
+            counts[i + 1] += 1
+            counts[j + 1] += 1
+    for i in range(n):
+        counts[i + 1] += counts[i]
+    indices = array("l", [0]) * counts[n]
+    fill = array("l", counts[:n])
+    for i, j in edges:
+        if i != j:
+            indices[fill[i]] = j
+            fill[i] += 1
+            indices[fill[j]] = i
+            fill[j] += 1
+    # Sort every run and squeeze out repeated neighbours
+    indptr = array("l", [0])
+    size = 0
+    for i in range(n):
+        for other in sorted(set(indices[counts[i]:counts[i + 1]])):
+            indices[size] = other
+            size += 1
+        indptr.append(size)
+    del indices[size:]
+    return Topology(indptr, indices, cells)
+
+def grid_topology(rows, cols):
+    # Rows of cells c<i>_<j>, the layout of lights_out_board.py
+    edges = [(i * cols + j, i * cols + j + 1) for i in range(rows) for j in range(cols - 1)]
+    edges += [(i * cols + j, (i + 1) * cols + j) for i in range(rows - 1) for j in range(cols)]
+    return edge_topology(rows * cols, edges, get_grid_cells(rows, cols))
+
+def torus_topology(rows, cols):
+    # A grid whose edges wrap around, every cell has four neighbours once both sides are at least 3
+    edges = [(i * cols + j, i * cols + (j + 1) % cols) for i in range(rows) for j in range(cols)]
+    edges += [(i * cols + j, (i + 1) % rows * cols + j) for i in range(rows) for j in range(cols)]
+    return edge_topology(rows * cols, edges, get_grid_cells(rows, cols))
+
+def hex_topology(rows, cols):
+    # Hexagonal cells in offset rows, every odd row shifted half a cell to the right
+    edges = [(i * cols + j, i * cols + j + 1) for i in range(rows) for j in range(cols - 1)]
+    for i in range(rows - 1):
+        shift = i % 2
+        for j in range(cols):
+            for k in (j - 1 + shift, j + shift):
+                if 0 <= k < cols:
+                    edges.append((i * cols + j, (i + 1) * cols + k))
+    return edge_topology(rows * cols, edges, get_grid_cells(rows, cols))
+
+def problem_topology(problem, index):
+    """
+    Build the topology of the cell_adjacent facts of a parsed PDDL problem.
+
+    Args:
+        problem (Problem): Parsed PDDL problem.
+        index (dict): Id of every cell name.
+    """
+    from parsers import BinaryPredicate
+    edges = [(index[fact.parameter1], index[fact.parameter2]) for fact in problem.init
+             if isinstance(fact, BinaryPredicate) and fact.positive]
+    cells = [None] * len(index)
+    for cell, i in index.items():
+        cells[i] = cell
+    return edge_topology(len(index), edges, cells)
+
+def get_grid_cells(rows, cols):
+    return tuple(f"c{i}_{j}" for i in range(rows) for j in range(cols))
+
+TOPOLOGIES = {"grid": grid_topology, "torus": torus_topology, "hex": hex_topology}
@@ -0,0 +1,58 @@
+import os
+import sys
+import random
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from batch import get_geometry
+from board_solver import astar_search
+from board_solver_gf2 import get_press_set
+from board_solver_mcts import MCTS
+from instrumentation import SearchStats
+
+GEOMETRIES = [(2, 3, "grid"), (2, 4, "grid"), (3, 3, "grid"), (3, 3, "hex")]
+
+def get_boards(rows, cols, topology, count=4, seed=0):
+    # Solvable by construction: the goal with a random set of presses undone
+    board, _ = get_geometry(rows, cols, topology)
+    rng = random.Random(seed)
+    boards = []
+    for _ in range(count):
+        state = board.goal
+        for mask in board.masks:
+            if rng.random() < 0.5:
+                state ^= mask
+        boards.append(board._replace(init=state))
+    return boards
+
+def get_cost(plan):
+    return len(plan) - 1
+
+def run_astar(board, successors):
+    stats = SearchStats()
+    plan = astar_search(board, "toggle", stats, successors=successors)
+    return get_cost(plan), stats.counters["expansions"]
+
+@pytest.mark.parametrize("rows, cols, topology", GEOMETRIES)
+def test_astar_ordered_successors_keep_the_optimal_cost(rows, cols, topology):
+    for board in get_boards(rows, cols, topology):
+        optimum = get_press_set(board).bit_count()
+        cost, expansions = run_astar(board, "all")
+        ordered_cost, ordered_expansions = run_astar(board, "ordered")
+        assert cost == ordered_cost == optimum
+        assert ordered_expansions <= expansions
+
+@pytest.mark.parametrize("rows, cols, topology", [(3, 3, "grid"), (3, 3, "hex")])
+def test_astar_ordered_successors_expand_far_fewer_states(rows, cols, topology):
+    boards = get_boards(rows, cols, topology, count=8)
+    expansions = sum(run_astar(board, "all")[1] for board in boards)
+    ordered_expansions = sum(run_astar(board, "ordered")[1] for board in boards)
+    assert ordered_expansions * 2 <= expansions
+
+@pytest.mark.parametrize("rows, cols, topology", GEOMETRIES)
+def test_mcts_ordered_and_unordered_successors_find_the_same_cost(rows, cols, topology):
+    for board in get_boards(rows, cols, topology):
+        unordered = MCTS(board, seed=0, successors="all").run(iterations=3000)
+        ordered = MCTS(board, seed=0, successors="ordered").run(iterations=3000)
+        assert get_cost(ordered) == get_cost(unordered) == get_press_set(board).bit_count()